@@ -0,0 +1,228 @@
+import argparse
+import math
+import sys
+
+from indexes import normalize
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: sem ele os cálculos são feitos em Python puro
+    np = None
+
+# Relatórios de estoque: valor total (quantidade * preço), totais e médias por
+# categoria, percentis de preço e produtos com estoque baixo.
+#
+# Os totais ficam materializados em InventoryStats, que o ProductStore mantém
+# como um índice: a carga monta tudo de uma vez (com colunas NumPy, se o NumPy
+# estiver instalado) e cada inclusão, alteração ou exclusão só ajusta os totais
+# do produto afetado, então atualizar um painel não percorre o catálogo.
+# Valores em dinheiro são somados em centavos inteiros, para que os ajustes
+# incrementais não acumulem erros de arredondamento.
+#
+# Uso:
+#     python analytics.py [--low-stock 10] [--limit 20]
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+
+# Função para converter um preço em centavos inteiros
+def to_cents(price):
+    return int(round(price * 100))
+
+
+# Função para dividir totais inteiros (sem limite de tamanho) sem estourar o float:
+# um resultado grande demais vira infinito em vez de levantar OverflowError
+def divide(total, count):
+    try:
+        return total / count
+    except OverflowError:
+        return math.inf if total > 0 else -math.inf
+
+
+class InventoryStats:
+    fields = ('category', 'quantity', 'price')
+
+    def __init__(self):
+        self.count = 0
+        self.total_quantity = 0
+        self.total_value_cents = 0
+        # categoria normalizada -> [nome exibido, produtos, quantidade, soma dos preços, valor], em centavos
+        self._categories = {}
+
+    def rebuild(self, products):
+        products = list(products)
+        self._categories = {}
+        if np is not None and products:
+            try:
+                self._rebuild_columns(products)
+                return
+            except OverflowError:
+                # Quantidade grande demais para int64: soma em Python puro, com inteiros sem limite
+                self._categories = {}
+        self.count = self.total_quantity = self.total_value_cents = 0
+        for product in products:
+            self.add(product)
+
+    # Monta os totais de forma vetorizada a partir de colunas NumPy
+    def _rebuild_columns(self, products):
+        codes = {}  # categoria normalizada -> posição
+        labels = []
+        category_codes = []
+        for product in products:
+            key = normalize(product['category'])
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(labels)
+                labels.append(product['category'])
+            category_codes.append(code)
+
+        size = len(products)
+        category_column = np.array(category_codes, dtype=np.int64)
+        quantity = np.fromiter((product['quantity'] for product in products), dtype=np.int64, count=size)
+        price = np.fromiter((to_cents(product['price']) for product in products), dtype=np.int64, count=size)
+        value = quantity * price
+
+        self.count = size
+        self.total_quantity = int(quantity.sum())
+        self.total_value_cents = int(value.sum())
+        counts = np.bincount(category_column, minlength=len(labels))
+        quantities = np.bincount(category_column, weights=quantity, minlength=len(labels))
+        prices = np.bincount(category_column, weights=price, minlength=len(labels))
+        values = np.bincount(category_column, weights=value, minlength=len(labels))
+        for key, code in codes.items():
+            self._categories[key] = [labels[code], int(counts[code]), int(round(quantities[code])),
+                                     int(round(prices[code])), int(round(values[code]))]
+
+    def add(self, product):
+        self._adjust(product, 1)
+
+    def extend(self, products):
+        for product in products:
+            self._adjust(product, 1)
+
+    # O ProductStore chama remove() antes de alterar o produto, então os valores
+    # lidos aqui ainda são os que foram somados em add()
+    def remove(self, product):
+        self._adjust(product, -1)
+
+    def _adjust(self, product, sign):
+        quantity = product['quantity']
+        price = to_cents(product['price'])
+        self.count += sign
+        self.total_quantity += sign * quantity
+        self.total_value_cents += sign * quantity * price
+
+        key = normalize(product['category'])
+        entry = self._categories.get(key)
+        if entry is None:
+            entry = self._categories[key] = [product['category'], 0, 0, 0, 0]
+        entry[1] += sign
+        entry[2] += sign * quantity
+        entry[3] += sign * price
+        entry[4] += sign * quantity * price
+        if entry[1] == 0:
+            del self._categories[key]
+
+    # Retorna os totais do catálogo
+    def totals(self):
+        return {
+            'products': self.count,
+            'quantity': self.total_quantity,
+            'value': divide(self.total_value_cents, 100),
+        }
+
+    # Retorna {categoria: {products, quantity, value, mean_price, mean_quantity}}, em ordem alfabética
+    def by_category(self):
+        report = {}
+        for key in sorted(self._categories):
+            label, count, quantity, price, value = self._categories[key]
+            report[label] = {
+                'products': count,
+                'quantity': quantity,
+                'value': divide(value, 100),
+                'mean_price': divide(price, count * 100),
+                'mean_quantity': divide(quantity, count),
+            }
+        return report
+
+
+# Função para obter a posição do percentil (método do posto mais próximo)
+def percentile_rank(size, pct):
+    return min(size, max(1, math.ceil(pct / 100 * size))) - 1
+
+
+# Retorna os totais do catálogo sem percorrê-lo
+def totals(store):
+    with store.lock:
+        return store.inventory().totals()
+
+
+# Retorna os totais e médias por categoria sem percorrer o catálogo
+def by_category(store):
+    with store.lock:
+        return store.inventory().by_category()
+
+
+# Retorna {percentil: preço}. Usa o índice ordenado por preço quando existe;
+# senão seleciona as posições com numpy.partition (ou ordena, sem NumPy)
+def price_percentiles(store, percents=PERCENTILES):
+    # len() carrega o catálogo, e a carga (ou uma releitura) instala índices novos:
+    # o índice só é lido depois disso, sob o lock
+    len(store)
+    with store.lock:
+        index = store.sorted_indexes.get('price')
+        if index is not None:
+            size = len(store)
+            return {pct: index.key_at(percentile_rank(size, pct)) for pct in percents} if size else {}
+    prices = [product['price'] for product in store.all()]
+    if not prices:
+        return {}
+    ranks = [percentile_rank(len(prices), pct) for pct in percents]
+    if np is not None:
+        column = np.partition(np.array(prices, dtype=np.float64), sorted(set(ranks)))
+        return {pct: float(column[rank]) for pct, rank in zip(percents, ranks)}
+    prices.sort()
+    return {pct: prices[rank] for pct, rank in zip(percents, ranks)}
+
+
+# Retorna os produtos com estoque abaixo do limite, do menor para o maior estoque
+def low_stock(store, threshold):
+    return store.range('quantity', high=threshold - 1)
+
+
+def main(argv=None):
+    from product_store import ProductStore
+
+    parser = argparse.ArgumentParser(description="Relatório de estoque da AgileStore.")
+    parser.add_argument('--low-stock', type=int, default=10, help="Limite de estoque baixo (padrão: 10)")
+    parser.add_argument('--limit', type=int, default=20, help="Quantidade de produtos de estoque baixo exibidos")
+    args = parser.parse_args(argv)
+    store = ProductStore()
+
+    summary = totals(store)
+    print(f"\nProdutos: {summary['products']}")
+    print(f"Itens em estoque: {summary['quantity']}")
+    print(f"Valor total em estoque: R$ {summary['value']:.2f}")
+
+    print("\n{:<20} | {:>9} | {:>10} | {:>16} | {:>12}".format("Categoria", "Produtos", "Quantidade", "Valor (R$)", "Preço médio"))
+    print("=" * 79)
+    for category, entry in by_category(store).items():
+        print("{:<20} | {:>9} | {:>10} | {:>16.2f} | {:>12.2f}".format(
+            category, entry['products'], entry['quantity'], entry['value'], entry['mean_price']))
+
+    percentiles = price_percentiles(store)
+    if percentiles:
+        print("\nPercentis de preço: " + ", ".join(f"p{pct} = R$ {price:.2f}" for pct, price in percentiles.items()))
+
+    products = low_stock(store, args.low_stock)
+    print(f"\n{len(products)} produto(s) com estoque abaixo de {args.low_stock}:")
+    for product in products[:args.limit]:
+        print(f"- {product['id']} | {product['name']} | {product['category']} | {product['quantity']}")
+    if len(products) > args.limit:
+        print(f"... e mais {len(products) - args.limit}.")
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmark das operações do catálogo com catálogos sintéticos.
+#
+# Roda sem interface gráfica e sem entrada do usuário. Para cada tamanho de
+# catálogo e cada modo de armazenamento é gerado um products.json sintético e um
+# processo separado mede carga, busca, listagem, ordenação, inclusão,
+# atualização e exclusão (p50/p95/p99, operações por segundo e pico de memória).
+# O resultado é gravado em JSON para comparar modos e versões.
+#
+# Uso:
+#     python benchmark.py run --sizes 1k,10k,100k --modes json,journal,sqlite
+#     python benchmark.py compare resultado_antigo.json resultado_novo.json
+
+DEFAULT_SIZES = '1k,10k,100k'
+DEFAULT_MODES = 'json,journal,sqlite'
+DEFAULT_OPS = 200
+DEFAULT_BUDGET = 5.0  # segundos por operação
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+# Categorias com peso (frequência relativa) e produtos típicos de cada uma
+CATALOG = {
+    'Bebidas': (20, ['Suco', 'Refrigerante', 'Água Mineral', 'Cerveja', 'Café', 'Chá', 'Energético']),
+    'Alimentos': (25, ['Arroz', 'Feijão', 'Macarrão', 'Farinha', 'Açúcar', 'Biscoito', 'Molho de Tomate']),
+    'Limpeza': (12, ['Detergente', 'Sabão em Pó', 'Desinfetante', 'Esponja', 'Água Sanitária']),
+    'Higiene': (12, ['Sabonete', 'Shampoo', 'Creme Dental', 'Desodorante', 'Papel Higiênico']),
+    'Hortifrúti': (10, ['Maçã', 'Banana', 'Tomate', 'Cebola', 'Batata', 'Limão']),
+    'Eletrônicos': (6, ['Fone de Ouvido', 'Carregador', 'Cabo USB', 'Mouse', 'Teclado', 'Pilha']),
+    'Papelaria': (8, ['Caderno', 'Caneta', 'Lápis', 'Borracha', 'Marca-texto']),
+    'Padaria': (7, ['Pão Francês', 'Bolo', 'Torrada', 'Pão de Queijo', 'Rosca']),
+}
+BRANDS = ['Aurora', 'Bom Dia', 'Campestre', 'Delícia', 'Estrela', 'Fazenda', 'Girassol', 'Horizonte',
+          'Ipê', 'Jardim', 'Lumière', 'Maré', 'Nativa', 'Ouro Fino', 'Primor', 'Serrano', 'Tropical']
+VARIANTS = ['', ' 200g', ' 500g', ' 1kg', ' 5kg', ' 350ml', ' 1L', ' 2L', ' Integral', ' Light',
+            ' Zero', ' Tradicional', ' Premium', ' Econômico', ' Família']
+
+
+# Função para converter tamanhos como '1k', '2.5M' ou '1000' em inteiros
+def parse_size(text):
+    text = text.strip()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:].lower(), 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+# Função para gerar produtos sintéticos realistas (sem 'id'), de forma reprodutível
+def generate_products(count, seed=42):
+    rng = random.Random(seed)
+    categories = list(CATALOG)
+    weights = [CATALOG[category][0] for category in categories]
+    for _ in range(count):
+        category = rng.choices(categories, weights)[0]
+        item = rng.choice(CATALOG[category][1])
+        # Preços com distribuição log-normal e parte do estoque baixo
+        yield {
+            'name': f"{item} {rng.choice(BRANDS)}{rng.choice(VARIANTS)}",
+            'category': category,
+            'quantity': rng.randint(1, 20) if rng.random() < 0.2 else rng.randint(20, 1000),
+            'price': max(0.5, round(rng.lognormvariate(2.5, 0.9), 2)),
+        }
+
+
+# Função para gravar um catálogo sintético no formato do products.json, em streaming
+def write_catalog(path, count, seed=42):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for product_id, product in enumerate(generate_products(count, seed), start=1):
+            if product_id > 1:
+                file.write(',\n')
+            file.write(json.dumps({'id': product_id, **product}, ensure_ascii=False))
+        file.write(']\n')
+
+
+# Função para calcular o percentil (0-100) de uma lista ordenada, pelo método do posto mais próximo
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+# Função para resumir as durações (em segundos) de uma operação
+def summarize(durations):
+    values = sorted(durations)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'mean_ms': total / len(values) * 1000,
+        'throughput_ops_s': len(values) / total if total else None,
+    }
+
+
+# Função para medir fn(arg) para cada argumento, até acabar a lista ou o tempo
+def measure(fn, args, budget):
+    durations = []
+    deadline = time.perf_counter() + budget
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        end = time.perf_counter()
+        durations.append(end - start)
+        if end > deadline:
+            break
+    return summarize(durations)
+
+
+# Função para obter o pico de memória residente do processo, em MB
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é dado em bytes no macOS e em KB no Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Função para executar um caso (um tamanho, um modo) no diretório informado
+def run_case(directory, mode, ops, budget, seed, sorted_fields):
+    import load_cache
+    from product_store import ProductStore
+    from storage import create_backend
+
+    def open_store():
+        backend = create_backend(mode, file_path=os.path.join(directory, 'products.json'),
+                                 meta_path=os.path.join(directory, 'products.meta.json'),
+                                 journal_path=os.path.join(directory, 'products.journal'),
+                                 sqlite_path=os.path.join(directory, 'products.db'))
+        return ProductStore(backend, sorted_fields=sorted_fields)
+
+    # Na primeira abertura o modo SQLite migra o JSON; isso fica fora da medição
+    open_store().close()
+    load_cache.cache.invalidate()
+
+    results = {}
+    store = open_store()
+    start = time.perf_counter()
+    store.load()
+    results['load'] = summarize([time.perf_counter() - start])
+    results['refresh'] = measure(lambda _: store.refresh(), range(ops), budget)
+
+    rng = random.Random(seed)
+    ids = [product['id'] for product in store.all()]
+    names = [product['name'] for product in rng.sample(store.all(), min(ops, len(ids)))]
+    # Consultas de busca: trechos do meio dos nomes, com tamanhos variados
+    queries = []
+    for name in names:
+        length = rng.randint(2, min(8, len(name)))
+        offset = rng.randint(0, len(name) - length)
+        queries.append(name[offset:offset + length])
+    categories = list(store.categories())
+
+    results['get'] = measure(store.get, [rng.choice(ids) for _ in range(ops)], budget)
+    results['search'] = measure(store.search, queries, budget)
+    results['search_name'] = measure(store.search_name, queries, budget)
+    results['categories'] = measure(lambda _: store.categories(), range(ops), budget)
+    results['filter_category'] = measure(store.filter_category, [rng.choice(categories) for _ in range(ops)], budget)
+    for field in ('name', 'quantity', 'price'):
+        results[f'sort_{field}'] = measure(lambda _: store.sorted_by(field), range(ops), budget)
+    price_ranges = [sorted((round(rng.uniform(1, 50), 2), round(rng.uniform(1, 50), 2))) for _ in range(ops)]
+    results['range_price'] = measure(lambda bounds: store.range('price', *bounds), price_ranges, budget)
+    results['low_stock'] = measure(lambda _: store.range('quantity', high=9), range(ops), budget)
+
+    new_products = list(generate_products(ops, seed + 1))
+    results['add'] = measure(lambda row: store.add(row['name'], row['category'], row['quantity'], row['price']),
+                             new_products, budget)
+    targets = rng.sample(ids, min(ops, len(ids)))
+    results['update'] = measure(lambda product_id: store.update(product_id, price=round(rng.uniform(1, 100), 2)),
+                                targets, budget)
+    results['delete'] = measure(store.delete, targets, budget)
+
+    start = time.perf_counter()
+    store.close()
+    results['close'] = summarize([time.perf_counter() - start])
+    return {'operations': results, 'peak_rss_mb': peak_rss_mb()}
+
+
+# Função para executar um caso em um processo separado, para medir a memória de cada um isoladamente
+def run_case_subprocess(catalog_path, mode, ops, budget, seed, sorted_fields):
+    directory = tempfile.mkdtemp(prefix=f'agilestore-bench-{mode}-')
+    try:
+        shutil.copyfile(catalog_path, os.path.join(directory, 'products.json'))
+        command = [sys.executable, os.path.abspath(__file__), 'case', directory, '--mode', mode,
+                   '--ops', str(ops), '--budget', str(budget), '--seed', str(seed),
+                   '--sorted-indexes', ','.join(sorted_fields)]
+        completed = subprocess.run(command, capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            raise RuntimeError(f"Falha no caso '{mode}':\n{completed.stderr}")
+        return json.loads(completed.stdout)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# Função para imprimir a tabela de resultados de um caso
+def print_case(case):
+    print(f"\n{case['size']} produtos, modo {case['mode']} (pico de memória: {case['peak_rss_mb']:.1f} MB)")
+    print("{:<16} | {:>6} | {:>10} | {:>10} | {:>10} | {:>12}".format("Operação", "N", "p50 (ms)", "p95 (ms)",
+                                                                       "p99 (ms)", "ops/s"))
+    print("=" * 79)
+    for name, stats in case['operations'].items():
+        throughput = stats['throughput_ops_s']
+        print("{:<16} | {:>6} | {:>10.3f} | {:>10.3f} | {:>10.3f} | {:>12}".format(
+            name, stats['count'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            f"{throughput:.1f}" if throughput is not None else '-'))
+
+
+def run(args):
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    sorted_fields = [field for field in args.sorted_indexes.split(',') if field]
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'sizes': sizes, 'modes': modes, 'ops': args.ops, 'budget_s': args.budget,
+                     'seed': args.seed, 'sorted_indexes': sorted_fields},
+        'cases': [],
+    }
+
+    catalog_dir = tempfile.mkdtemp(prefix='agilestore-bench-')
+    try:
+        for size in sizes:
+            catalog_path = os.path.join(catalog_dir, f'products-{size}.json')
+            start = time.perf_counter()
+            write_catalog(catalog_path, size, args.seed)
+            print(f"\nCatálogo sintético com {size} produtos gerado em {time.perf_counter() - start:.1f} s.")
+            for mode in modes:
+                case = run_case_subprocess(catalog_path, mode, args.ops, args.budget, args.seed, sorted_fields)
+                case = {'size': size, 'mode': mode, **case}
+                report['cases'].append(case)
+                print_case(case)
+            os.remove(catalog_path)
+    finally:
+        shutil.rmtree(catalog_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4, ensure_ascii=False)
+    print(f"\nResultados gravados em '{args.output}'.")
+    return 0
+
+
+# Compara dois resultados e aponta as operações cujo p50 piorou além do limite
+def compare(args):
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, 'r', encoding='utf-8') as file:
+        current = json.load(file)
+
+    previous = {(case['size'], case['mode']): case for case in baseline['cases']}
+    regressions = 0
+    print("{:<10} | {:<8} | {:<16} | {:>12} | {:>12} | {:>7}".format("Tamanho", "Modo", "Operação", "antes (ms)",
+                                                                     "depois (ms)", "razão"))
+    print("=" * 80)
+    for case in current['cases']:
+        old_case = previous.get((case['size'], case['mode']))
+        if old_case is None:
+            continue
+        for name, stats in case['operations'].items():
+            old_stats = old_case['operations'].get(name)
+            if old_stats is None or not old_stats['p50_ms']:
+                continue
+            ratio = stats['p50_ms'] / old_stats['p50_ms']
+            marker = ''
+            if ratio > args.threshold:
+                marker = '  <- regressão'
+                regressions += 1
+            print("{:<10} | {:<8} | {:<16} | {:>12.3f} | {:>12.3f} | {:>6.2f}x{}".format(
+                case['size'], case['mode'], name, old_stats['p50_ms'], stats['p50_ms'], ratio, marker))
+
+    print(f"\n{regressions} regressão(ões) acima de {args.threshold:.2f}x.")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das operações do catálogo da AgileStore.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Gera catálogos sintéticos e mede as operações")
+    run_parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Tamanhos separados por vírgula (ex.: 1k,1M,10M)")
+    run_parser.add_argument('--modes', default=DEFAULT_MODES, help="Modos de armazenamento separados por vírgula")
+    run_parser.add_argument('--ops', type=int, default=DEFAULT_OPS, help="Repetições de cada operação")
+    run_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                            help="Tempo máximo, em segundos, gasto em cada operação")
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--sorted-indexes', default='name,quantity,price',
+                            help="Índices ordenados a manter (vazio para desativar)")
+    run_parser.add_argument('--output', default=DEFAULT_OUTPUT)
+
+    compare_parser = subparsers.add_parser('compare', help="Compara dois arquivos de resultados")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.25,
+                                help="Razão de p50 acima da qual a operação é considerada regressão")
+
+    # Usado internamente: executa um único caso e imprime o resultado em JSON
+    case_parser = subparsers.add_parser('case')
+    case_parser.add_argument('directory')
+    case_parser.add_argument('--mode', required=True)
+    case_parser.add_argument('--ops', type=int, default=DEFAULT_OPS)
+    case_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    case_parser.add_argument('--seed', type=int, default=42)
+    case_parser.add_argument('--sorted-indexes', default='name,quantity,price')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'compare':
+        return compare(args)
+    sorted_fields = [field for field in args.sorted_indexes.split(',') if field]
+    result = run_case(args.directory, args.mode, args.ops, args.budget, args.seed, sorted_fields)
+    json.dump(result, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
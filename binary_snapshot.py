@@ -0,0 +1,194 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from config import FILE_PATH
+
+# Snapshot binário do catálogo, gravado ao lado do products.json.
+#
+# O JSON continua sendo o formato de troca; o arquivo binário (products.bin) é
+# só uma cópia compacta para a inicialização não precisar interpretar o JSON.
+# Ele guarda a assinatura (mtime, tamanho, inode) do JSON a partir do qual foi
+# gerado: se o JSON mudar, o binário é descartado e gerado de novo.
+#
+# Formato (little-endian):
+#   cabeçalho de 64 bytes: "AGSB", versão, quantidade de produtos, quantidade de
+#   strings, assinatura do JSON, tamanho e CRC32 do conteúdo
+#   conteúdo: seções prefixadas pelo tamanho (u64) e alinhadas em 8 bytes:
+#     tabela de strings (nomes e categorias em UTF-8, separados por \0)
+#     colunas: id (i64), nome (u32, posição na tabela), categoria (u32),
+#     quantidade (i64), preço (f64)
+#
+# As colunas ficam alinhadas para poderem ser lidas direto de um mmap.
+#
+# Uso:
+#     python binary_snapshot.py build [--json products.json]
+#     python binary_snapshot.py info [--json products.json]
+
+MAGIC = b'AGSB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQqqQQI4x')
+SECTION = struct.Struct('<Q')
+# Tipos das colunas, na ordem em que são gravadas
+COLUMN_TYPES = ('q', 'I', 'I', 'q', 'd')
+
+
+# Função para obter o caminho do snapshot binário de um snapshot JSON
+def binary_path(json_path):
+    return os.path.splitext(json_path)[0] + '.bin'
+
+
+def _padding(length):
+    return -length % 8
+
+
+# Função para gravar as linhas (id, nome, categoria, quantidade, preço) no formato
+# binário, de forma atômica. stamp é a assinatura do JSON com o mesmo conteúdo.
+# Retorna False se algum valor não couber no formato (o JSON continua valendo).
+def write_binary(path, rows, stamp):
+    strings = {}
+    columns = [array(type_code) for type_code in COLUMN_TYPES]
+    ids, names, categories, quantities, prices = columns
+    try:
+        for product_id, name, category, quantity, price in rows:
+            if '\0' in name or '\0' in category:
+                return False
+            ids.append(product_id)
+            names.append(strings.setdefault(name, len(strings)))
+            categories.append(strings.setdefault(category, len(strings)))
+            quantities.append(quantity)
+            prices.append(price)
+    except (OverflowError, TypeError):
+        return False
+
+    table = '\0'.join(strings).encode('utf-8')
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+    sections = [table] + [column.tobytes() for column in columns]
+
+    payload = bytearray()
+    for section in sections:
+        payload += SECTION.pack(len(section))
+        payload += section
+        payload += b'\0' * _padding(len(section))
+
+    mtime_ns, size, inode = stamp
+    header = HEADER.pack(MAGIC, VERSION, 0, len(ids), len(strings), mtime_ns, size, inode,
+                         len(payload), zlib.crc32(payload))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(header)
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return True
+
+
+# Função para ler o cabeçalho; retorna a tupla do cabeçalho ou None se o arquivo não for válido
+def read_header(path):
+    try:
+        with open(path, 'rb') as file:
+            data = file.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    header = HEADER.unpack(data)
+    if header[0] != MAGIC or header[1] != VERSION:
+        return None
+    return header
+
+
+# Função para calcular o CRC32 do conteúdo em blocos, sem copiar o arquivo inteiro
+def _checksum(mapped, start, block_size=16 * 1024 * 1024):
+    checksum = 0
+    for offset in range(start, len(mapped), block_size):
+        checksum = zlib.crc32(mapped[offset:offset + block_size], checksum)
+    return checksum
+
+
+# Função para ler as linhas do snapshot binário. Retorna None se ele não existir,
+# estiver corrompido ou não corresponder ao JSON com a assinatura "stamp".
+def read_binary(path, stamp):
+    header = read_header(path)
+    if header is None:
+        return None
+    _, _, _, count, string_count, mtime_ns, size, inode, payload_length, checksum = header
+    if stamp is None or (mtime_ns, size, inode) != tuple(stamp):
+        return None
+
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size != HEADER.size + payload_length:
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if _checksum(mapped, HEADER.size) != checksum:
+                return None
+            sections = []
+            offset = HEADER.size
+            for _ in range(1 + len(COLUMN_TYPES)):
+                (length,) = SECTION.unpack_from(mapped, offset)
+                offset += SECTION.size
+                sections.append((offset, length))
+                offset += length + _padding(length)
+
+            start, length = sections[0]
+            strings = mapped[start:start + length].decode('utf-8').split('\0') if string_count else []
+            columns = []
+            for type_code, (start, length) in zip(COLUMN_TYPES, sections[1:]):
+                column = array(type_code)
+                column.frombytes(mapped[start:start + length])
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                columns.append(column)
+
+    if len(strings) != string_count or any(len(column) != count for column in columns):
+        return None
+    ids, names, categories, quantities, prices = columns
+    # Categorias se repetem: a tabela de strings já as deixa compartilhadas
+    return list(zip(ids.tolist(), map(strings.__getitem__, names), map(strings.__getitem__, categories),
+                    quantities.tolist(), prices.tolist()))
+
+
+def main(argv=None):
+    import load_cache
+    from storage import parse_json_snapshot
+
+    parser = argparse.ArgumentParser(description="Snapshot binário do catálogo da AgileStore.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, help_text in (('build', "Gera o snapshot binário a partir do JSON"),
+                               ('info', "Mostra se o snapshot binário está válido")):
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument('--json', default=FILE_PATH)
+    args = parser.parse_args(argv)
+
+    path = binary_path(args.json)
+    stamp = load_cache.file_stamp(args.json)
+    if stamp is None:
+        print(f"Erro: arquivo '{args.json}' não encontrado.")
+        return 1
+    if args.command == 'build':
+        rows = parse_json_snapshot(args.json)
+        if not write_binary(path, rows, stamp):
+            print("Erro: o catálogo tem valores que não cabem no formato binário.")
+            return 1
+        print(f"{len(rows)} produto(s) gravado(s) em '{path}'.")
+        return 0
+
+    header = read_header(path)
+    if header is None:
+        print(f"'{path}' não existe ou não é um snapshot binário válido.")
+        return 1
+    rows = read_binary(path, stamp)
+    state = "válido" if rows is not None else "desatualizado ou corrompido"
+    print(f"'{path}': {header[3]} produto(s), {header[4]} string(s), {os.path.getsize(path)} bytes, {state}.")
+    return 0 if rows is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from product import FIELDS
+from product_store import ProductStore, validate_product
+
+# Importação e exportação em massa de produtos (CSV ou JSON Lines).
+#
+# A entrada é lida em streaming e validada em lotes com as mesmas regras da
+# opção "Adicionar Produto". As linhas válidas recebem IDs em bloco e tudo é
+# gravado de uma vez no final; as linhas rejeitadas são reportadas com o número
+# da linha e o motivo. Se a leitura falhar no meio (arquivo corrompido, erro de
+# disco), os produtos já incluídos são desfeitos e nada é gravado.
+#
+# Uso:
+#     python bulk_io.py import fornecedor.csv [--rejects rejeitados.csv]
+#     python bulk_io.py export catalogo.jsonl
+
+BATCH_SIZE = 10000
+
+
+# Função para descobrir o formato pelo nome do arquivo
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f"Formato não reconhecido para '{path}'. Use .csv ou .jsonl.")
+
+
+# Função para ler as linhas de entrada como (número da linha, dicionário ou erro)
+def read_rows(file, fmt):
+    if fmt == 'csv':
+        # A linha 1 é o cabeçalho
+        for line_number, row in enumerate(csv.DictReader(file), start=2):
+            yield line_number, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield line_number, None
+                continue
+            yield line_number, row if isinstance(row, dict) else None
+
+
+# Função para converter e validar uma linha; retorna (produto, None) ou (None, erro)
+def parse_row(row):
+    if row is None:
+        return None, "Linha não é um objeto JSON válido."
+    try:
+        name = str(row.get('name') or '').strip()
+        category = str(row.get('category') or '').strip()
+        quantity, price = row['quantity'], row['price']
+        # Como no servidor: true/false não são números e 2.7 não é uma quantidade
+        if isinstance(quantity, bool) or isinstance(price, bool):
+            raise ValueError
+        if isinstance(quantity, float) and quantity != int(quantity):
+            raise ValueError
+        quantity = int(quantity)
+        price = float(price)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None, "Quantidade e preço devem ser valores numéricos válidos."
+    error = validate_product(name, category, quantity, price)
+    if error:
+        return None, error
+    return {'name': name, 'category': category, 'quantity': quantity, 'price': price}, None
+
+
+# Função para importar produtos de um arquivo; retorna (quantidade importada, rejeitados)
+def import_products(store, path, fmt=None, batch_size=BATCH_SIZE):
+    fmt = fmt or detect_format(path)
+    rejected = []  # (número da linha, motivo)
+    batch = []
+    added = []  # IDs já incluídos, desfeitos se a leitura falhar
+    with store.batch():
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                for line_number, row in read_rows(file, fmt):
+                    product, error = parse_row(row)
+                    if error:
+                        rejected.append((line_number, error))
+                        continue
+                    batch.append(product)
+                    if len(batch) >= batch_size:
+                        added.extend(product['id'] for product in store.add_many(batch))
+                        batch = []
+                if batch:
+                    added.extend(product['id'] for product in store.add_many(batch))
+        except BaseException:
+            # Ainda dentro do batch(): incluir e excluir antes de gravar não grava nada
+            if added:
+                store.delete_many(ids=added)
+            raise
+    return len(added), rejected
+
+
+# Função para exportar o catálogo em streaming; retorna a quantidade exportada
+def export_products(store, path, fmt=None):
+    fmt = fmt or detect_format(path)
+    exported = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if fmt == 'csv':
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            for product in store:
+                writer.writerow({field: product[field] for field in FIELDS})
+                exported += 1
+        else:
+            for product in store:
+                file.write(json.dumps({field: product[field] for field in FIELDS}, ensure_ascii=False) + '\n')
+                exported += 1
+    return exported
+
+
+# Função para gravar o relatório de linhas rejeitadas em CSV
+def write_rejects(path, rejected):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['linha', 'motivo'])
+        writer.writerows(rejected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importação e exportação em massa de produtos da AgileStore.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Importa produtos de um arquivo CSV ou JSONL")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'])
+    import_parser.add_argument('--rejects', help="Arquivo CSV onde gravar as linhas rejeitadas")
+
+    export_parser = subparsers.add_parser('export', help="Exporta o catálogo para um arquivo CSV ou JSONL")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=['csv', 'jsonl'])
+
+    args = parser.parse_args(argv)
+    store = ProductStore()
+
+    try:
+        if args.command == 'import':
+            imported, rejected = import_products(store, args.path, args.format)
+            print(f"{imported} produto(s) importado(s), {len(rejected)} linha(s) rejeitada(s).")
+            for line_number, error in rejected[:20]:
+                print(f"  Linha {line_number}: {error}")
+            if len(rejected) > 20:
+                print(f"  ... e mais {len(rejected) - 20} linha(s).")
+            if args.rejects and rejected:
+                write_rejects(args.rejects, rejected)
+                print(f"Linhas rejeitadas gravadas em '{args.rejects}'.")
+        else:
+            exported = export_products(store, args.path, args.format)
+            print(f"{exported} produto(s) exportado(s) para '{args.path}'.")
+    except (OSError, ValueError) as error:
+        print(f"Erro: {error}")
+        return 1
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import bisect
+import itertools
+
+# Snapshots imutáveis do catálogo, com compartilhamento estrutural.
+#
+# O ProductStore guarda a ordem de inserção dos produtos em blocos (tuplas de
+# até CHUNK_SIZE produtos). Uma alteração copia só o bloco afetado, nunca o
+# catálogo inteiro, e os produtos também não são alterados no lugar (o store
+# troca o objeto por uma cópia com os campos novos). Um snapshot é só a tupla de
+# blocos de uma versão: criar um custa O(n / CHUNK_SIZE), e versões seguidas
+# compartilham todos os blocos que não mudaram.
+#
+# Uma CatalogView é uma projeção de um snapshot (resultado de busca, filtro ou
+# ordenação); o próprio snapshot é a visão na ordem original, então voltar a ela
+# não copia nada.
+
+CHUNK_SIZE = 1024
+
+
+class CatalogSnapshot:
+    __slots__ = ('version', '_chunks', '_starts', '_length')
+
+    def __init__(self, chunks, version):
+        self.version = version  # Muda a cada alteração do catálogo
+        self._chunks = chunks
+        # Posição do primeiro produto de cada bloco, para localizar um índice por bisect
+        self._starts = list(itertools.accumulate((len(chunk) for chunk in chunks), initial=0))
+        self._length = self._starts[-1]
+
+    @property
+    def snapshot(self):
+        return self
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                return tuple(self[position] for position in range(start, stop, step))
+            return self._slice(start, stop)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("índice fora do catálogo")
+        chunk = bisect.bisect_right(self._starts, index) - 1
+        return self._chunks[chunk][index - self._starts[chunk]]
+
+    # Copia só os blocos que cobrem [start, stop): O(tamanho da fatia)
+    def _slice(self, start, stop):
+        if start >= stop:
+            return ()
+        rows = []
+        chunk = bisect.bisect_right(self._starts, start) - 1
+        while chunk < len(self._chunks) and self._starts[chunk] < stop:
+            offset = self._starts[chunk]
+            rows.extend(self._chunks[chunk][max(0, start - offset):stop - offset])
+            chunk += 1
+        return tuple(rows)
+
+    # Retorna uma projeção deste snapshot com os produtos informados, na ordem dada
+    def view(self, products):
+        return CatalogView(self, products)
+
+    # Retorna uma projeção ordenada, sem alterar o snapshot
+    def sorted(self, key, reverse=False):
+        return CatalogView(self, sorted(self, key=key, reverse=reverse))
+
+
+class CatalogView:
+    __slots__ = ('snapshot', '_rows')
+
+    def __init__(self, snapshot, products):
+        self.snapshot = snapshot
+        self._rows = tuple(products)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+    def view(self, products):
+        return CatalogView(self.snapshot, products)
+
+    def sorted(self, key, reverse=False):
+        return CatalogView(self.snapshot, sorted(self._rows, key=key, reverse=reverse))
+
+
+# Blocos da ordem de inserção mantidos pelo ProductStore, a partir dos quais os
+# snapshots são montados. Todas as alterações substituem blocos inteiros.
+class ChunkedCatalog:
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._chunk_of = {}  # ID -> posição do bloco que contém o produto
+        self._empty = 0  # Blocos esvaziados por exclusões
+
+    def rebuild(self, products):
+        self._chunks = []
+        self._chunk_of = {}
+        self._empty = 0
+        self.extend(products)
+
+    # Acrescenta produtos no fim: completa o último bloco e cria os blocos seguintes
+    def extend(self, products):
+        products = list(products)
+        size = self.chunk_size
+        if self._chunks and len(self._chunks[-1]) < size:
+            room = size - len(self._chunks[-1])
+            self._set_chunk(len(self._chunks) - 1, self._chunks[-1] + tuple(products[:room]), products[:room])
+            products = products[room:]
+        for start in range(0, len(products), size):
+            self._chunks.append(())
+            block = products[start:start + size]
+            self._set_chunk(len(self._chunks) - 1, tuple(block), block)
+
+    def _set_chunk(self, position, chunk, added):
+        self._chunks[position] = chunk
+        for product in added:
+            self._chunk_of[product['id']] = position
+
+    def append(self, product):
+        self.extend((product,))
+
+    # Troca o produto de mesmo ID pela nova versão, mantendo a posição
+    def replace(self, product):
+        product_id = product['id']
+        position = self._chunk_of[product_id]
+        self._chunks[position] = tuple(product if item['id'] == product_id else item for item in self._chunks[position])
+
+    def remove(self, product_id):
+        position = self._chunk_of.pop(product_id, None)
+        if position is None:
+            return
+        chunk = tuple(item for item in self._chunks[position] if item['id'] != product_id)
+        self._chunks[position] = chunk
+        if not chunk:
+            self._empty += 1
+            # Muitos blocos vazios: reagrupa (raro, amortizado pelas exclusões)
+            if self._empty > len(self._chunks) // 2:
+                self.rebuild(itertools.chain.from_iterable(self._chunks))
+
+    def snapshot(self, version):
+        return CatalogSnapshot(tuple(chunk for chunk in self._chunks if chunk), version)
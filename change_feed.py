@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+# Alterações do catálogo campo a campo e linhas ainda não gravadas.
+#
+# Cada alteração feita pelo ProductStore vira uma ou mais Change(id, field, old,
+# new), publicadas para quem assinou o catálogo (store.subscribe): caches e
+# índices externos se atualizam só com o que mudou, sem percorrer o catálogo.
+#   - alteração de um campo: Change(id, 'price', 10.0, 12.5)
+#   - inclusão: Change(id, None, None, produto)
+#   - exclusão: Change(id, None, produto, None)
+#   - RELOADED (todos os campos None): o catálogo foi relido inteiro (carga ou
+#     releitura após gravações de outro processo), e o assinante deve se refazer
+#
+# DirtyRows guarda as linhas alteradas desde a última gravação, já combinadas
+# por produto: várias alterações do mesmo produto viram um único registro só
+# com os campos que realmente mudaram, um campo que volta ao valor gravado sai
+# do registro, e incluir e excluir o mesmo produto antes de gravar não grava
+# nada. Os registros seguem o formato de storage.apply_record().
+
+Change = namedtuple('Change', 'id field old new')
+
+RELOADED = Change(None, None, None, None)
+
+
+# Função para calcular as alterações de campo de um produto; retorna
+# {campo: (valor atual, valor novo)} só com os campos que mudam
+def field_changes(product, fields):
+    return {field: (product[field], value) for field, value in fields.items() if product[field] != value}
+
+
+class DirtyRows:
+    def __init__(self):
+        self._rows = {}  # ID -> registro combinado, na ordem da primeira alteração
+        self._original = {}  # ID -> {campo: valor gravado} das linhas atualizadas
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __bool__(self):
+        return bool(self._rows)
+
+    # Retorna os registros a gravar
+    def records(self):
+        return list(self._rows.values())
+
+    def added(self, product):
+        self._rows[product['id']] = {'op': 'add', 'product': dict(product)}
+
+    # changes: {campo: (valor anterior, valor novo)}, como em field_changes()
+    def updated(self, product_id, changes):
+        row = self._rows.get(product_id)
+        if row is not None and row['op'] == 'add':
+            # Produto ainda não gravado: a inclusão já sai com os valores novos
+            row['product'].update((field, new) for field, (_, new) in changes.items())
+            return
+        original = self._original.setdefault(product_id, {})
+        fields = row['fields'] if row is not None else {}
+        for field, (old, new) in changes.items():
+            if original.setdefault(field, old) == new:
+                # Voltou ao valor gravado: não há o que gravar neste campo
+                del original[field]
+                fields.pop(field, None)
+            else:
+                fields[field] = new
+        if fields:
+            self._rows[product_id] = {'op': 'update', 'id': product_id, 'fields': fields}
+        else:
+            self._rows.pop(product_id, None)
+            del self._original[product_id]
+
+    def deleted(self, product_id):
+        row = self._rows.pop(product_id, None)
+        self._original.pop(product_id, None)
+        if row is None or row['op'] != 'add':
+            self._rows[product_id] = {'op': 'delete', 'id': product_id}
+
+    # Aplica por cima as linhas de "other", alteradas depois destas (usado para
+    # devolver à fila um lote cuja gravação falhou)
+    def merge(self, other):
+        for product_id, row in other._rows.items():
+            if row['op'] == 'add':
+                self.added(row['product'])
+            elif row['op'] == 'delete':
+                self.deleted(product_id)
+            else:
+                original = other._original[product_id]
+                self.updated(product_id, {field: (original[field], new) for field, new in row['fields'].items()})
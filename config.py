@@ -0,0 +1,63 @@
+import os
+
+# Configurações compartilhadas entre o main.py e o mainComInterface.py.
+# Todas podem ser sobrescritas por variáveis de ambiente.
+
+# Caminho do arquivo JSON onde os produtos serão armazenados (snapshot)
+FILE_PATH = os.environ.get('AGILESTORE_FILE', 'products.json')
+
+# Arquivo de metadados do snapshot (contador de IDs)
+META_PATH = os.environ.get('AGILESTORE_META', os.path.splitext(FILE_PATH)[0] + '.meta.json')
+
+# Snapshot binário (products.bin) ao lado do JSON, para acelerar a inicialização
+# (ver binary_snapshot.py): '1' ativa
+BINARY_SNAPSHOT = os.environ.get('AGILESTORE_BINARY_SNAPSHOT', '0') != '0'
+
+# Modo de armazenamento (ver storage.py):
+# - 'json': reescreve o products.json inteiro a cada alteração
+# - 'journal': anexa cada alteração ao journal e compacta em segundo plano
+# - 'sqlite': grava cada alteração no banco SQLite, linha a linha
+STORAGE_MODE = os.environ.get('AGILESTORE_STORAGE', 'json')
+
+# Banco usado no modo 'sqlite'
+SQLITE_PATH = os.environ.get('AGILESTORE_SQLITE', os.path.splitext(FILE_PATH)[0] + '.db')
+
+# Arquivo de journal usado no modo 'journal'
+JOURNAL_PATH = os.environ.get('AGILESTORE_JOURNAL', os.path.splitext(FILE_PATH)[0] + '.journal')
+
+# Quantidade de registros no journal que dispara a compactação em segundo plano
+COMPACT_THRESHOLD = int(os.environ.get('AGILESTORE_COMPACT_THRESHOLD', '1000'))
+
+# Campos com índice ordenado mantido em memória (separados por vírgula).
+# Deixe vazio para desativar; a ordenação passa a ser feita sob demanda.
+SORTED_INDEXES = [field for field in os.environ.get('AGILESTORE_SORTED_INDEXES', 'name,quantity,price').split(',') if field]
+
+# Quantidade de IDs reservados de uma vez no contador compartilhado entre processos;
+# os IDs de um bloco são entregues da memória, sem lock entre processos a cada inclusão
+ID_BLOCK_SIZE = int(os.environ.get('AGILESTORE_ID_BLOCK', '1000'))
+
+# Quantidade de produtos carregados por bloco na abertura da interface gráfica
+LOAD_CHUNK_SIZE = int(os.environ.get('AGILESTORE_LOAD_CHUNK', '20000'))
+
+# Quantidade máxima de resultados da busca aproximada (por nome parecido)
+FUZZY_LIMIT = int(os.environ.get('AGILESTORE_FUZZY_LIMIT', '10'))
+
+# Quantidade de produtos por página nas listagens do terminal
+PAGE_SIZE = int(os.environ.get('AGILESTORE_PAGE_SIZE', '20'))
+
+# Tabela virtualizada na interface gráfica: só as linhas visíveis são materializadas
+VIRTUAL_TABLE = os.environ.get('AGILESTORE_VIRTUAL_TABLE', '1') != '0'
+
+# Instrumentação dos caminhos críticos (ver metrics.py): '1' ativa
+METRICS = os.environ.get('AGILESTORE_METRICS', '0') != '0'
+
+# Opção do menu do terminal cuja primeira execução é perfilada com o cProfile
+# (ex.: '2' para "Listar Produtos"), e o arquivo onde o perfil é gravado
+PROFILE_ACTION = os.environ.get('AGILESTORE_PROFILE', '')
+PROFILE_OUTPUT = os.environ.get('AGILESTORE_PROFILE_OUTPUT', 'agilestore.prof')
+
+# Servidor HTTP (ver server.py): endereço, porta e a janela, em segundos, em que
+# as escritas que chegam juntas são agrupadas em uma única gravação
+SERVER_HOST = os.environ.get('AGILESTORE_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('AGILESTORE_PORT', '8080'))
+GROUP_COMMIT_DELAY = float(os.environ.get('AGILESTORE_GROUP_COMMIT_DELAY', '0.005'))
@@ -0,0 +1,326 @@
+import bisect
+import heapq
+import unicodedata
+from array import array
+from collections import Counter
+
+import metrics
+
+# Índices secundários mantidos pelo ProductStore.
+#
+# Todo índice implementa rebuild(products), extend(products), add(product) e
+# remove(product). O rebuild() é usado ao carregar o catálogo (e extend() ao
+# carregá-lo em blocos); depois disso o ProductStore chama remove() antes de
+# alterar um produto e add() depois, então os índices são sempre atualizados no
+# lugar e nunca precisam ser reconstruídos. Como o ProductStore não altera um
+# produto publicado, remove() recebe a versão que foi passada a add(): os índices
+# recalculam a chave antiga a partir dela, em vez de guardar um dicionário
+# ID -> chave (que ocuparia mais memória que o próprio produto).
+#
+# O atributo "fields" lista os campos do produto que o índice usa: numa
+# alteração, o ProductStore só atualiza os índices de algum campo que mudou
+# (mudar o preço não refaz os trigramas do nome).
+
+# Similaridade mínima (0 a 1) para um produto aparecer na busca aproximada:
+# a fração dos trigramas da consulta que o nome precisa ter
+FUZZY_MIN_SCORE = 0.3
+
+
+# Função para normalizar um texto antes de indexar ou buscar: remove acentos
+# (decomposição NFKD sem as marcas combinantes) e ignora maiúsculas (casefold),
+# então "Pão de Queijo", "pao de queijo" e "PÃO DE QUEIJO" têm a mesma chave
+def normalize(text):
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+# Função para obter o conjunto de trigramas de um texto já normalizado
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Função para verificar se um ID está em um array ordenado de IDs
+def _contains(posting, product_id):
+    position = bisect.bisect_left(posting, product_id)
+    return position < len(posting) and posting[position] == product_id
+
+
+class TrigramIndex:
+    # key_func extrai do produto o texto indexado, já normalizado (ex.: a chave de
+    # busca do nome, calculada uma vez por produto, ou o ID como string); key_of(ID)
+    # devolve o texto atual de um produto indexado, para confirmar os resultados;
+    # fields são os campos de que esse texto depende.
+    #
+    # Cada lista de postagens é um array ordenado de IDs (8 bytes por ID, contra
+    # dezenas num set). IDs novos são sempre maiores que os existentes, então
+    # incluir um produto só acrescenta no fim dos arrays.
+    def __init__(self, key_func, key_of, fields=()):
+        self.key_func = key_func
+        self.key_of = key_of
+        self.fields = fields
+        self._postings = {}  # trigrama -> array ordenado de IDs
+        self._short_keys = set()  # IDs com texto curto demais para ter trigramas
+
+    def rebuild(self, products):
+        self._postings.clear()
+        self._short_keys.clear()
+        self.extend(products)
+
+    def add(self, product):
+        product_id = product['id']
+        key = self.key_func(product)
+        if len(key) < 3:
+            self._short_keys.add(product_id)
+        for gram in trigrams(key):
+            posting = self._postings.get(gram)
+            if posting is None:
+                self._postings[gram] = array('q', (product_id,))
+            elif posting[-1] < product_id:
+                posting.append(product_id)
+            else:
+                bisect.insort(posting, product_id)
+
+    # Acrescenta um bloco de produtos (carga em blocos): agrupa os IDs por trigrama
+    # e acrescenta cada grupo, ordenado, de uma vez
+    def extend(self, products):
+        block = {}
+        for product in products:
+            product_id = product['id']
+            key = self.key_func(product)
+            if len(key) < 3:
+                self._short_keys.add(product_id)
+            for gram in trigrams(key):
+                ids = block.get(gram)
+                if ids is None:
+                    block[gram] = [product_id]
+                else:
+                    ids.append(product_id)
+        for gram, ids in block.items():
+            ids.sort()
+            posting = self._postings.get(gram)
+            if posting is None:
+                self._postings[gram] = array('q', ids)
+            elif posting[-1] < ids[0]:
+                posting.extend(ids)
+            else:
+                self._postings[gram] = array('q', sorted(posting + array('q', ids)))
+
+    def remove(self, product):
+        product_id = product['id']
+        key = self.key_func(product)
+        self._short_keys.discard(product_id)
+        for gram in trigrams(key):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            position = bisect.bisect_left(posting, product_id)
+            if position < len(posting) and posting[position] == product_id:
+                del posting[position]
+                if not posting:
+                    del self._postings[gram]
+
+    # Retorna o conjunto de IDs cujo texto contém a consulta
+    def search(self, query):
+        query = normalize(query)
+        if len(query) < 3:
+            # Consultas curtas não têm trigramas, mas todo texto que as contém tem um
+            # trigrama que as contém: une as postagens desses trigramas
+            result = {product_id for product_id in self._short_keys if query in self.key_of(product_id)}
+            if metrics.enabled:
+                metrics.count('search.trigram', rows_scanned=len(self._short_keys), grams_scanned=len(self._postings))
+            for gram, posting in self._postings.items():
+                if query in gram:
+                    result.update(posting)
+            return result
+
+        postings = []
+        for gram in trigrams(query):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+
+        # Intersecta a partir da menor lista de postagens: com poucos candidatos,
+        # procura cada um no array ordenado por bisect; com muitos, percorre o array
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if len(candidates) * 16 < len(posting):
+                candidates = {product_id for product_id in candidates if _contains(posting, product_id)}
+            else:
+                candidates.intersection_update(posting)
+            if not candidates:
+                return candidates
+
+        # Trigramas em comum não garantem a substring: confirma cada candidato
+        if metrics.enabled:
+            metrics.count('search.trigram', rows_scanned=len(candidates))
+        key_of = self.key_of
+        return {product_id for product_id in candidates if query in key_of(product_id)}
+
+    # Busca aproximada: retorna até "limit" pares (similaridade, ID), do mais
+    # parecido para o menos. A similaridade é a fração dos trigramas da consulta
+    # que aparecem no texto, então erros de digitação e letras trocadas ainda
+    # encontram o produto, e um nome longo que contém a consulta vale 1.0 (a
+    # similaridade de Jaccard com o nome inteiro descartaria esses nomes). Textos
+    # que contêm a consulta vêm sempre primeiro; entre similaridades iguais, vem
+    # antes o texto com mais trigramas em comum proporcionalmente ao seu tamanho.
+    def fuzzy(self, query, limit=10, min_score=FUZZY_MIN_SCORE):
+        query = normalize(query)
+        query_grams = trigrams(query)
+        if not query_grams:
+            # Consulta curta demais para ter trigramas: só a busca por substring
+            return [(1.0, product_id) for product_id in heapq.nsmallest(limit, self.search(query))]
+
+        # Conta quantos trigramas da consulta cada produto tem, direto das postagens
+        shared = Counter()
+        for gram in query_grams:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                shared.update(posting)
+
+        required = min_score * len(query_grams)
+        key_of = self.key_of
+        scored = []
+        for product_id, common in shared.items():
+            if common < required:
+                continue
+            key = key_of(product_id)
+            # Desempate pela similaridade de Jaccard com o texto inteiro
+            jaccard = common / (len(query_grams) + len(trigrams(key)) - common)
+            scored.append((query in key, common / len(query_grams), jaccard, -product_id))
+        if metrics.enabled:
+            metrics.count('search.fuzzy', rows_scanned=len(shared), rows_scored=len(scored))
+        return [(1.0 if contains else score, -negative_id)
+                for contains, score, _, negative_id in heapq.nlargest(limit, scored)]
+
+
+class CategoryIndex:
+    fields = ('category',)
+
+    def __init__(self):
+        self._ids = {}  # categoria normalizada -> IDs dos produtos
+        self._labels = {}  # categoria normalizada -> nome exibido
+
+    def rebuild(self, products):
+        self._ids.clear()
+        self._labels.clear()
+        for product in products:
+            self.add(product)
+
+    def add(self, product):
+        key = normalize(product['category'])
+        ids = self._ids.get(key)
+        if ids is None:
+            ids = self._ids[key] = set()
+            self._labels[key] = product['category']
+        ids.add(product['id'])
+
+    def extend(self, products):
+        for product in products:
+            self.add(product)
+
+    def remove(self, product):
+        key = normalize(product['category'])
+        ids = self._ids.get(key)
+        if ids is None:
+            return
+        ids.discard(product['id'])
+        if not ids:
+            del self._ids[key]
+            del self._labels[key]
+
+    # Retorna {categoria: quantidade de produtos}, em ordem alfabética
+    def counts(self):
+        return {self._labels[key]: len(self._ids[key]) for key in sorted(self._ids)}
+
+    # Retorna os IDs dos produtos da categoria (sem diferenciar maiúsculas)
+    def ids(self, category):
+        return set(self._ids.get(normalize(category), ()))
+
+    # Retorna os IDs das categorias que contêm o texto informado
+    def search(self, query):
+        query = normalize(query)
+        result = set()
+        for key, ids in self._ids.items():
+            if query in key:
+                result |= ids
+        return result
+
+
+# Funções que extraem a chave de ordenação de cada campo
+SORT_KEYS = {
+    'name': lambda product: product.name_key,
+    'quantity': lambda product: product['quantity'],
+    'price': lambda product: product['price'],
+}
+
+
+class SortedIndex:
+    # Lista ordenada de (chave, ID), mantida com inserções por bisect.
+    # O ID desempata chaves iguais, preservando a ordem de inserção.
+    def __init__(self, field):
+        self.field = field
+        self.fields = (field,)
+        self.key_func = SORT_KEYS[field]
+        self._entries = []
+
+    def rebuild(self, products):
+        self._entries = sorted((self.key_func(product), product['id']) for product in products)
+
+    def add(self, product):
+        bisect.insort(self._entries, (self.key_func(product), product['id']))
+
+    # Acrescenta um bloco de produtos: ordena o bloco e intercala com as entradas
+    # existentes (o sort do Python aproveita as duas sequências já ordenadas)
+    def extend(self, products):
+        block = sorted((self.key_func(product), product['id']) for product in products)
+        self._entries.extend(block)
+        self._entries.sort()
+
+    def remove(self, product):
+        entry = (self.key_func(product), product['id'])
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Retorna a chave na posição informada da ordem crescente
+    def key_at(self, position):
+        return self._entries[position][0]
+
+    # Retorna os IDs em ordem crescente (ou decrescente) da chave
+    def ids(self, reverse=False):
+        entries = reversed(self._entries) if reverse else self._entries
+        return [product_id for _, product_id in entries]
+
+    # Percorre as entradas (chave, ID) a partir da primeira depois de "after" (cursor de
+    # uma página anterior), sem copiar a lista; reverse=True percorre em ordem decrescente
+    def iter_from(self, after=None, reverse=False):
+        entries = self._entries
+        if reverse:
+            position = len(entries) if after is None else bisect.bisect_left(entries, tuple(after))
+            while position > 0:
+                position -= 1
+                yield entries[position]
+        else:
+            position = 0 if after is None else bisect.bisect_right(entries, tuple(after))
+            while position < len(entries):
+                yield entries[position]
+                position += 1
+
+    # Retorna os IDs com low <= chave <= high (limites None são abertos)
+    def range(self, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(self._entries, (low,))
+        end = len(self._entries) if high is None else bisect.bisect_right(self._entries, (high, float('inf')))
+        return [product_id for _, product_id in self._entries[start:end]]
+
+    # Retorna os k primeiros IDs (menores chaves) ou os k últimos (maiores chaves)
+    def top(self, k, largest=False):
+        if largest:
+            return [product_id for _, product_id in reversed(self._entries[-k:])] if k > 0 else []
+        return [product_id for _, product_id in self._entries[:max(0, k)]]
@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+
+from config import LOAD_CHUNK_SIZE
+
+# Thread de gravação usada pela interface gráfica.
+#
+# A interface altera o ProductStore em memória (atualização otimista) e só pede
+# uma gravação com submit(). A thread junta os pedidos que chegam em sequência
+# em um único flush() do store, então uma rajada de edições vira uma escrita só.
+# O resultado volta para a thread do Tk por uma verificação periódica com
+# root.after, pois widgets Tk não podem ser tocados por outras threads. A mesma
+# thread faz as releituras pedidas com refresh(), que também acessam o disco.
+#
+# BackgroundLoader segue o mesmo padrão para a carga inicial: a janela abre
+# vazia e o catálogo é lido em blocos por outra thread (ver
+# ProductStore.load_in_chunks), com o progresso entregue à thread do Tk.
+
+_STOP = object()
+
+
+class PersistenceWorker:
+    # on_done(quantidade_gravada, erro) é chamado na thread do Tk após cada gravação
+    def __init__(self, store, root, on_done=None, coalesce_delay=0.2, poll_interval=100):
+        self.store = store
+        self.root = root
+        self.on_done = on_done
+        self.coalesce_delay = coalesce_delay
+        self.poll_interval = poll_interval
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='persistence-worker', daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    # Pede a gravação das alterações pendentes do store
+    def submit(self):
+        self._jobs.put(None)
+
+    # Relê o catálogo se outro processo o alterou (ProductStore.refresh);
+    # on_done(relido, erro) é chamado na thread do Tk
+    def refresh(self, on_done):
+        self._jobs.put(on_done)
+
+    # Grava o que faltar e encerra a thread (usado ao fechar a janela)
+    def close(self):
+        self._jobs.put(_STOP)
+        self._thread.join()
+
+    # Cada pedido na fila é None (gravar), _STOP ou o callback de um refresh()
+    def _run(self):
+        while True:
+            jobs = [self._jobs.get()]
+            if jobs[0] is None:
+                # Espera um pouco para juntar as edições seguintes na mesma gravação
+                time.sleep(self.coalesce_delay)
+            while True:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(job is _STOP for job in jobs)
+            refreshes = [job for job in jobs if job is not None and job is not _STOP]
+            if len(refreshes) < len(jobs):
+                try:
+                    self._results.put((self.on_done, (self.store.flush(), None)))
+                except Exception as error:
+                    self._results.put((self.on_done, (0, error)))
+            for on_done in refreshes:
+                try:
+                    self._results.put((on_done, (self.store.refresh(), None)))
+                except Exception as error:
+                    self._results.put((on_done, (False, error)))
+            if stop:
+                return
+
+    # Entrega os resultados à thread do Tk
+    def _poll(self):
+        while True:
+            try:
+                callback, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if callback is not None:
+                callback(*result)
+        if self._thread.is_alive():
+            self.root.after(self.poll_interval, self._poll)
+
+
+class BackgroundLoader:
+    # on_progress(carregados, total) e on_done(erro) são chamados na thread do Tk.
+    # Vários blocos carregados entre duas verificações geram um único on_progress.
+    def __init__(self, store, root, on_progress=None, on_done=None, chunk_size=LOAD_CHUNK_SIZE, poll_interval=50):
+        self.store = store
+        self.root = root
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self._results = queue.Queue()
+        self.store.begin_load()
+        self._thread = threading.Thread(target=self._run, name='catalog-loader', daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    def _run(self):
+        def on_chunk(loaded, total):
+            self._results.put(('progress', (loaded, total)))
+        try:
+            self.store.load_in_chunks(self.chunk_size, on_chunk)
+        except Exception as error:
+            self._results.put(('done', error))
+        else:
+            self._results.put(('done', None))
+
+    # Entrega o progresso mais recente e o fim da carga à thread do Tk
+    def _poll(self):
+        progress = None
+        done = False
+        error = None
+        while True:
+            try:
+                kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                progress = value
+            else:
+                done, error = True, value
+        if progress is not None and self.on_progress is not None:
+            self.on_progress(*progress)
+        if done:
+            if self.on_done is not None:
+                self.on_done(error)
+            return
+        self.root.after(self.poll_interval, self._poll)
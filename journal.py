@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+
+import load_cache
+import metrics
+from process_lock import FileLock, lock_path
+from storage import (StorageBackend, advance_next_id, apply_record, next_id_for, read_meta, read_snapshot,
+                     release_ids, reserve_ids, write_snapshot)
+
+# Armazenamento em journal (somente anexação).
+#
+# Cada alteração vira uma linha JSON compacta no arquivo de journal:
+#   {"op":"add","product":{...}}
+#   {"op":"update","id":3,"fields":{"price":2.75}}
+#   {"op":"delete","id":3}
+#
+# Na inicialização o snapshot (products.json, no mesmo formato de sempre) é lido
+# e o journal é reaplicado por cima. Quando o journal cresce demais ele é
+# compactado em segundo plano em um novo snapshot.
+#
+# O JournalBackend expõe esse armazenamento para o ProductStore (ver storage.py).
+#
+# Vários processos podem anexar ao mesmo journal: anexação e compactação são
+# feitas sob um lock entre processos e a leitura sob o mesmo lock compartilhado,
+# para nunca ver um snapshot novo com o journal antigo (ou o contrário).
+
+
+# Função para ler os registros de um arquivo de journal
+def read_records(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Última linha truncada por uma queda durante a escrita: ignora
+                break
+
+
+class Journal:
+    # on_compacted é chamado (na thread de compactação) quando um novo snapshot é gravado
+    def __init__(self, snapshot_path, journal_path, compact_threshold=1000, meta_path=None, on_compacted=None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.meta_path = meta_path
+        self.on_compacted = on_compacted
+        # Maior ID já inserido pelo journal (mesmo que o produto tenha sido excluído depois)
+        self.max_added_id = 0
+        # Journal "congelado" enquanto a compactação está em andamento
+        self.compacting_path = journal_path + '.compacting'
+        self.compact_threshold = compact_threshold
+        self.record_count = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+        self.lock = FileLock(lock_path(snapshot_path))  # Entre processos
+        self.meta_lock = FileLock(lock_path(meta_path)) if meta_path else None
+
+    # Carrega o snapshot e reaplica o journal (inclusive um journal de compactação interrompida)
+    @metrics.timed('load.journal')
+    def load(self):
+        with self.lock.shared():
+            products_by_id = {product['id']: product for product in read_snapshot(self.snapshot_path)}
+            for path in (self.compacting_path, self.journal_path):
+                for record in read_records(path):
+                    apply_record(products_by_id, record)
+                    if record['op'] == 'add':
+                        self.max_added_id = max(self.max_added_id, record['product']['id'])
+            self.record_count = sum(1 for _ in read_records(self.journal_path))
+        if metrics.enabled:
+            metrics.count('load.journal', records=self.record_count, rows=len(products_by_id))
+        return list(products_by_id.values())
+
+    # Anexa um registro ao journal e dispara a compactação se necessário
+    def append(self, record):
+        self.append_many([record])
+
+    # Anexa vários registros com uma única escrita (e um único fsync)
+    @metrics.timed('save.journal_append')
+    def append_many(self, records):
+        data = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records)
+        with self.lock, self._lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            self.record_count += len(records)
+            if metrics.enabled:
+                metrics.count('save.journal_append', bytes_written=len(data.encode('utf-8')), rows=len(records))
+            should_compact = self.record_count >= self.compact_threshold
+        if should_compact:
+            self.compact_async()
+
+    # Inicia a compactação em uma thread separada (no máximo uma por vez)
+    def compact_async(self):
+        with self.lock, self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            if os.path.exists(self.journal_path):
+                if os.path.exists(self.compacting_path):
+                    # Sobrou de uma compactação interrompida: junta o journal atual a ele
+                    with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                            open(self.compacting_path, 'a', encoding='utf-8') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+                else:
+                    # Novas alterações passam a ir para um journal vazio
+                    os.replace(self.journal_path, self.compacting_path)
+            if not os.path.exists(self.compacting_path):
+                return None
+            self.record_count = 0
+            # Thread não-daemon: o interpretador espera a compactação terminar ao sair
+            self._compactor = threading.Thread(target=self._compact, name='journal-compactor')
+            self._compactor.start()
+            return self._compactor
+
+    # Reescreve o snapshot com o journal congelado aplicado e descarta esse journal
+    def _compact(self):
+        with self.lock:
+            # Outro processo pode ter compactado o mesmo journal enquanto esperávamos o lock
+            if not os.path.exists(self.compacting_path):
+                return
+            products_by_id = {product['id']: product for product in read_snapshot(self.snapshot_path)}
+            max_added_id = 0
+            for record in read_records(self.compacting_path):
+                apply_record(products_by_id, record)
+                if record['op'] == 'add':
+                    max_added_id = max(max_added_id, record['product']['id'])
+            write_snapshot(self.snapshot_path, list(products_by_id.values()))
+            if self.meta_path:
+                # Preserva o contador de IDs mesmo que os produtos mais novos tenham sido excluídos
+                advance_next_id(self.meta_path, self.meta_lock, max_added_id + 1)
+            os.remove(self.compacting_path)
+        if self.on_compacted is not None:
+            self.on_compacted()
+
+    # Aguarda a compactação em andamento, se houver
+    def wait(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+
+class JournalBackend(StorageBackend):
+    def __init__(self, file_path, journal_path, meta_path, compact_threshold=1000):
+        self.journal = Journal(file_path, journal_path, compact_threshold, meta_path,
+                               on_compacted=self._compacted)
+        self.meta_path = meta_path
+        self.lock = self.journal.lock
+
+    def _compacted(self):
+        if self.on_compacted is not None:
+            self.on_compacted()
+
+    def load(self):
+        products = self.journal.load()
+        next_id = next_id_for(products, read_meta(self.meta_path).get('next_id', 1))
+        return products, max(next_id, self.journal.max_added_id + 1)
+
+    def allocate_ids(self, count, next_id):
+        return reserve_ids(self.meta_path, self.journal.meta_lock, count, next_id)
+
+    def release_ids(self, first_id, end):
+        release_ids(self.meta_path, self.journal.meta_lock, first_id, end)
+
+    def commit(self, records, products, next_id):
+        self.journal.append_many(records)
+
+    def version(self):
+        journal = self.journal
+        return tuple(load_cache.file_stamp(path)
+                     for path in (journal.snapshot_path, journal.journal_path, journal.compacting_path))
+
+    def close(self):
+        self.journal.wait()
+        self.journal.lock.close()
+        self.journal.meta_lock.close()
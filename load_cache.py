@@ -0,0 +1,58 @@
+import os
+
+# Cache de leitura de arquivos validado por (st_mtime_ns, st_size, st_ino).
+#
+# Enquanto o arquivo não muda, load() devolve a estrutura já interpretada sem
+# ler o disco de novo; só quando outro processo grava o arquivo o conteúdo é
+# interpretado outra vez. Depois de uma gravação feita por este processo,
+# remember() registra o novo conteúdo para que a próxima leitura também seja
+# um acerto. Os dados em cache devem ser tratados como somente leitura.
+
+
+# Função para obter a "assinatura" de um arquivo (None se ele não existir)
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class LoadCache:
+    def __init__(self):
+        self._entries = {}  # caminho -> (assinatura, dados)
+        self.hits = 0
+        self.misses = 0
+
+    # Retorna o conteúdo do arquivo interpretado por parser(path), usando o cache se possível
+    def load(self, path, parser):
+        stamp = file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        data = parser(path)
+        # Só guarda se o arquivo não mudou durante a leitura
+        if stamp is not None and file_stamp(path) == stamp:
+            self._entries[path] = (stamp, data)
+        return data
+
+    # Registra o conteúdo que este processo acabou de gravar no arquivo
+    def remember(self, path, data):
+        stamp = file_stamp(path)
+        if stamp is not None:
+            self._entries[path] = (stamp, data)
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# Cache compartilhado por todo o processo (terminal e interface gráfica)
+cache = LoadCache()
@@ -1,66 +1,60 @@
-import json
-import os
+import argparse
+import itertools
+import math
 
-# Caminho do arquivo JSON onde os produtos serão armazenados
-FILE_PATH = 'products.json'
+import metrics
+from config import PAGE_SIZE, PROFILE_ACTION, PROFILE_OUTPUT
+from product_store import ProductStore, adjust_price, set_field, validate_product
 
-# Função para carregar os produtos do arquivo JSON
-def load_products():
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    else:
-        return []
-
-# Função para salvar os produtos no arquivo JSON
-def save_products(products):
-    with open(FILE_PATH, 'w', encoding='utf-8') as file:
-        json.dump(products, file, indent=4, ensure_ascii=False)
-
-# Função para obter o próximo ID disponível
-def get_next_id(products):
-    if products:
-        return max(product['id'] for product in products) + 1
-    else:
-        return 1
+# Catálogo carregado uma única vez e mantido em memória
+store = ProductStore()
 
 # Função para adicionar um novo produto
 def add_product(name, category, quantity, price):
-    if not all([name.strip(), category.strip()]):
-        print("\nErro: Nome e Categoria não podem estar vazios!")
-        return
-
-    if quantity <= 0 or price <= 0:
-        print("\nErro: Quantidade e Preço devem ser maiores que zero!")
+    error = validate_product(name, category, quantity, price)
+    if error:
+        print(f"\nErro: {error}")
         return
 
-    products = load_products()
-    product_id = get_next_id(products)
-    product = {
-        'id': product_id,
-        'name': name.strip(),
-        'category': category.strip(),
-        'quantity': quantity,
-        'price': price
-    }
-    products.append(product)
-    save_products(products)
+    store.add(name.strip(), category.strip(), quantity, price)
     print("\nProduto adicionado com sucesso!")
     print("=" * 50)
 
-# Função para listar as categorias existentes
-def list_categories(products):
-    categories = set(product['category'] for product in products)
+# Função para exibir uma tabela de produtos
+@metrics.timed('cli.render')
+def print_products(products):
+    print("\n{:<5} | {:<35} | {:<15} | {:<10} | {:<10}".format("ID", "Nome", "Categoria", "Quantidade", "Preço"))
+    print("=" * 85)
+    for product in products:
+        print("{:<5} | {:<35} | {:<15} | {:<10} | {:<10.2f}".format(product['id'], product['name'], product['category'], product['quantity'], product['price']))
+    if metrics.enabled:
+        metrics.count('cli.render', rows_rendered=len(products))
+
+# Função para exibir os produtos de um iterador página por página; só a página
+# atual fica em memória. Retorna a quantidade de produtos exibidos.
+def print_pages(products, page_size=PAGE_SIZE):
+    products = iter(products)
+    shown = 0
+    page = list(itertools.islice(products, page_size))
+    while page:
+        print_products(page)
+        shown += len(page)
+        page = list(itertools.islice(products, page_size))
+        if page and input(f"\n{shown} produto(s) exibido(s). Enter para a próxima página ou 's' para parar: ").strip().lower() == 's':
+            break
+    return shown
+
+# Função para listar as categorias existentes com a quantidade de produtos de cada uma
+def list_categories():
+    categories = store.categories()
     print("\nCategorias disponíveis:")
-    for category in categories:
-        print(f"- {category}")
+    for category, count in categories.items():
+        print(f"- {category} ({count})")
     return categories
 
 # Função para listar todos os produtos com opções de filtragem e ordenação
 def list_products():
-    products = load_products()
-
-    if not products:
+    if not len(store):
         print("\nNenhum produto encontrado.")
     else:
         print("\nFiltros e Ordenação:")
@@ -69,38 +63,74 @@ def list_products():
         print("3. Ordenar por quantidade")
         print("4. Ordenar por preço")
         print("5. Exibir todos os produtos")
-        choice = input("\nEscolha uma opção de filtro ou ordenação (1-5): ")
+        print("6. Filtrar por faixa de preço")
+        print("7. Filtrar por estoque abaixo de uma quantidade")
+        print("8. Produtos mais caros")
+        print("9. Produtos com menor estoque")
+        choice = input("\nEscolha uma opção de filtro ou ordenação (1-9): ")
 
+        # As listagens são geradas sob demanda e exibidas página por página
         if choice == '1':
-            list_categories(products)
+            list_categories()
             category = input("\nDigite a categoria para filtrar: ")
-            products = [product for product in products if category.lower() in product['category'].lower()]
-            if not products:
-                print(f"\nNenhum produto encontrado na categoria '{category}'.")
+            products = store.iter_category(category)
         elif choice == '2':
-            products.sort(key=lambda x: x['name'].lower())
+            products = store.iter_sorted('name')
             print("\nProdutos ordenados por nome.")
         elif choice == '3':
-            products.sort(key=lambda x: x['quantity'])
+            products = store.iter_sorted('quantity')
             print("\nProdutos ordenados por quantidade.")
         elif choice == '4':
-            products.sort(key=lambda x: x['price'])
+            products = store.iter_sorted('price')
             print("\nProdutos ordenados por preço.")
-        elif choice != '5':
-            print("\nOpção inválida, mostrando todos os produtos.")
+        elif choice == '6':
+            try:
+                low = float(input("Preço mínimo: "))
+                high = float(input("Preço máximo: "))
+                products = store.iter_range('price', low, high)
+                print(f"\nProdutos com preço entre R$ {low:.2f} e R$ {high:.2f}.")
+            except ValueError:
+                print("\nPreço inválido, mostrando todos os produtos.")
+                products = store.iter_all()
+        elif choice == '7':
+            try:
+                limit = int(input("Mostrar produtos com estoque abaixo de: "))
+                products = store.iter_range('quantity', high=limit - 1)
+                print(f"\nProdutos com estoque abaixo de {limit}.")
+            except ValueError:
+                print("\nQuantidade inválida, mostrando todos os produtos.")
+                products = store.iter_all()
+        elif choice in ('8', '9'):
+            try:
+                k = int(input("Quantos produtos exibir? ") or "10")
+                if k <= 0:
+                    raise ValueError
+            except ValueError:
+                print("\nQuantidade inválida, mostrando 10 produtos.")
+                k = 10
+            # Seleção dos k primeiros sem ordenar o catálogo inteiro
+            if choice == '8':
+                products = store.top('price', k, largest=True)
+                print(f"\nOs {k} produtos mais caros.")
+            else:
+                products = store.top('quantity', k)
+                print(f"\nOs {k} produtos com menor estoque.")
+        else:
+            if choice != '5':
+                print("\nOpção inválida, mostrando todos os produtos.")
+            products = store.iter_all()
 
-        print("\n{:<5} | {:<35} | {:<15} | {:<10} | {:<10}".format("ID", "Nome", "Categoria", "Quantidade", "Preço"))
-        print("=" * 85)
-        for product in products:
-            print("{:<5} | {:<35} | {:<15} | {:<10} | {:<10.2f}".format(product['id'], product['name'], product['category'], product['quantity'], product['price']))
+        if not print_pages(products):
+            if choice == '1':
+                print(f"\nNenhum produto encontrado na categoria '{category}'.")
+            else:
+                print("\nNenhum produto encontrado.")
 
     input("\nPressione Enter para continuar...")
     print("=" * 50)
 
 # Função para buscar um produto pelo ID ou nome
 def search_product():
-    products = load_products()
-
     print("\nBuscar Produto:")
     print("1. Buscar por ID")
     print("2. Buscar por parte do nome")
@@ -109,72 +139,73 @@ def search_product():
     found_products = []
 
     if choice == '1':
-        product_id = input("Digite o ID do produto: ")
-        for product in products:
-            if str(product['id']) == product_id:
+        product_id = input("Digite o ID do produto: ").strip()
+        if product_id.isdigit():
+            product = store.get(int(product_id))
+            if product is not None:
                 found_products.append(product)
     elif choice == '2':
         name_part = input("Digite parte do nome do produto: ")
-        for product in products:
-            if name_part.lower() in product['name'].lower():
-                found_products.append(product)
+        # Os resultados são gerados sob demanda, sem montar a lista de produtos encontrados
+        found_products = store.iter_search_name(name_part)
     else:
         print("\nOpção inválida!")
 
-    if found_products:
-        print("\n{:<5} | {:<35} | {:<15} | {:<10} | {:<10}".format("ID", "Nome", "Categoria", "Quantidade", "Preço"))
-        print("=" * 85)
-        for product in found_products:
-            print("{:<5} | {:<35} | {:<15} | {:<10} | {:<10.2f}".format(product['id'], product['name'], product['category'], product['quantity'], product['price']))
-    else:
-        print("\nNenhum produto encontrado.")
+    if not print_pages(found_products):
+        similar = store.fuzzy_search(name_part) if choice == '2' and name_part.strip() else []
+        if similar:
+            # Nenhum nome contém o texto: sugere os mais parecidos (acentos e erros de digitação)
+            print("\nNenhum produto encontrado. Produtos com nome parecido:")
+            print_products([product for _, product in similar])
+        else:
+            print("\nNenhum produto encontrado.")
 
     input("\nPressione Enter para continuar...")
     print("=" * 50)
 
 # Função para atualizar um produto
 def update_product(product_id):
-    products = load_products()
-    product_found = False
-
-    for product in products:
-        if product['id'] == product_id:
-            product_found = True
-
-            print("\nAtualize os campos do produto. Deixe em branco para manter o valor atual.")
-            name = input(f"Novo nome (Atual: {product['name']}): ").strip()
-            category = input(f"Nova categoria (Atual: {product['category']}): ").strip()
-            quantity = input(f"Nova quantidade (Atual: {product['quantity']}): ").strip()
-            price = input(f"Novo preço (Atual: R$ {product['price']:.2f}): ").strip()
-
-            if name:
-                product['name'] = name
-            if category:
-                product['category'] = category
-            if quantity:
-                try:
-                    quantity = int(quantity)
-                    if quantity > 0:
-                        product['quantity'] = quantity
-                    else:
-                        print("Quantidade deve ser maior que zero! Valor não alterado.")
-                except ValueError:
-                    print("Quantidade inválida! Valor não alterado.")
-            if price:
-                try:
-                    price = float(price)
-                    if price > 0:
-                        product['price'] = price
-                    else:
-                        print("Preço deve ser maior que zero! Valor não alterado.")
-                except ValueError:
-                    print("Preço inválido! Valor não alterado.")
-
-            break
-
-    if product_found:
-        save_products(products)
-        print(f"\nProduto ID {product_id} atualizado com sucesso!")
+    product = store.get(product_id)
+
+    if product is not None:
+        changes = {}
+
+        print("\nAtualize os campos do produto. Deixe em branco para manter o valor atual.")
+        name = input(f"Novo nome (Atual: {product['name']}): ").strip()
+        category = input(f"Nova categoria (Atual: {product['category']}): ").strip()
+        quantity = input(f"Nova quantidade (Atual: {product['quantity']}): ").strip()
+        price = input(f"Novo preço (Atual: R$ {product['price']:.2f}): ").strip()
+
+        if name:
+            changes['name'] = name
+        if category:
+            changes['category'] = category
+        if quantity:
+            try:
+                quantity = int(quantity)
+                if quantity > 0:
+                    changes['quantity'] = quantity
+                else:
+                    print("Quantidade deve ser maior que zero! Valor não alterado.")
+            except (ValueError, OverflowError):
+                print("Quantidade inválida! Valor não alterado.")
+        if price:
+            try:
+                price = float(price)
+                if not math.isfinite(price):
+                    raise ValueError
+                if price > 0:
+                    changes['price'] = price
+                else:
+                    print("Preço deve ser maior que zero! Valor não alterado.")
+            except (ValueError, OverflowError):
+                print("Preço inválido! Valor não alterado.")
+
+        # Sem valores novos (ou iguais aos atuais) não há o que gravar
+        if store.update(product_id, **changes) is product:
+            print("\nNenhuma alteração foi feita.")
+        else:
+            print(f"\nProduto ID {product_id} atualizado com sucesso!")
     else:
         print("\nProduto não encontrado.")
 
@@ -183,29 +214,144 @@ def update_product(product_id):
 
 # Função para excluir um produto
 def delete_product(product_id):
-    products = load_products()
-    product_found = False
+    product = store.get(product_id)
 
-    for product in products:
-        if product['id'] == product_id:
-            product_found = True
-            confirm = input(f"\nTem certeza de que deseja excluir o produto '{product['name']}'? (s/n): ").strip().lower()
-            if confirm == 's':
-                products.remove(product)
-                save_products(products)
-                print(f"\nProduto ID {product_id} excluído com sucesso!")
+    if product is not None:
+        confirm = input(f"\nTem certeza de que deseja excluir o produto '{product['name']}'? (s/n): ").strip().lower()
+        if confirm == 's':
+            store.delete(product_id)
+            print(f"\nProduto ID {product_id} excluído com sucesso!")
+        else:
+            print("\nExclusão cancelada.")
+    else:
+        print("\nProduto não encontrado.")
+
+    input("\nPressione Enter para continuar...")
+    print("=" * 50)
+
+# Função para ler uma lista de IDs como "1, 2, 10-20"; retorna um conjunto ou None se inválida
+def parse_ids(text):
+    ids = set()
+    try:
+        for part in text.replace(' ', '').split(','):
+            if not part:
+                continue
+            if '-' in part:
+                first, last = part.split('-')
+                ids.update(range(int(first), int(last) + 1))
             else:
-                print("\nExclusão cancelada.")
-            break
+                ids.add(int(part))
+    except ValueError:
+        return None
+    return ids
+
+# Função para aplicar uma alteração ou exclusão a vários produtos de uma vez
+def batch_actions():
+    print("\nAções em Lote:")
+    print("1. Reajustar preços (%)")
+    print("2. Definir quantidade em estoque")
+    print("3. Excluir produtos")
+    action = input("Escolha uma ação (1-3): ").strip()
+    if action not in ('1', '2', '3'):
+        print("\nOpção inválida!")
+        input("\nPressione Enter para continuar...")
+        return
 
-    if not product_found:
-        print("\nProduto não encontrado.")
+    print("\nAplicar a:")
+    print("1. Todos os produtos de uma categoria")
+    print("2. Uma lista de IDs (ex.: 1, 2, 10-20)")
+    target = input("Escolha uma opção (1-2): ").strip()
+    ids = category = None
+    if target == '1':
+        list_categories()
+        category = input("\nDigite a categoria: ").strip()
+    elif target == '2':
+        ids = parse_ids(input("Digite os IDs: "))
+        if ids is None:
+            print("\nLista de IDs inválida!")
+    else:
+        print("\nOpção inválida!")
+    if not category and not ids:
+        input("\nPressione Enter para continuar...")
+        return
+
+    transform = None
+    try:
+        if action == '1':
+            percent = float(input("Percentual de reajuste (ex.: 8 ou -10): "))
+            if percent <= -100:
+                raise ValueError
+            transform = adjust_price(percent)
+        elif action == '2':
+            quantity = int(input("Nova quantidade em estoque: "))
+            if quantity < 0:
+                raise ValueError
+            transform = set_field('quantity', quantity)
+    except ValueError:
+        print("\nValor inválido! Nenhum produto foi alterado.")
+        input("\nPressione Enter para continuar...")
+        return
+
+    selected = store.select(ids, category)
+    if not selected:
+        print("\nNenhum produto encontrado.")
+    else:
+        confirm = input(f"\n{len(selected)} produto(s) serão afetados. Confirmar? (s/n): ").strip().lower()
+        if confirm == 's':
+            if transform is None:
+                changed = store.delete_many(ids, category)
+                print(f"\n{len(changed)} produto(s) excluído(s) com sucesso!")
+            else:
+                try:
+                    changed = store.update_many(transform, ids, category)
+                    print(f"\n{len(changed)} produto(s) atualizado(s) com sucesso!")
+                except ValueError as error:
+                    print(f"\n{error} Nenhum produto foi alterado.")
+        else:
+            print("\nOperação cancelada.")
 
     input("\nPressione Enter para continuar...")
     print("=" * 50)
 
+# Função para executar uma opção do menu; retorna False para sair
+def run_action(choice):
+    if choice == '1':
+        name = input("Nome do Produto: ")
+        category = input("Categoria: ")
+        try:
+            quantity = int(input("Quantidade em Estoque: "))
+            price = float(input("Preço: "))
+            add_product(name, category, quantity, price)
+        except (ValueError, OverflowError):
+            print("\nEntrada inválida! Por favor, insira valores numéricos válidos para quantidade e preço.")
+    elif choice == '2':
+        list_products()
+    elif choice == '3':
+        search_product()
+    elif choice == '4':
+        try:
+            product_id = int(input("Digite o ID do produto a ser atualizado: "))
+            update_product(product_id)
+        except ValueError:
+            print("\nID inválido! Certifique-se de inserir um número válido.")
+    elif choice == '5':
+        try:
+            product_id = int(input("Digite o ID do produto a ser excluído: "))
+            delete_product(product_id)
+        except ValueError:
+            print("\nID inválido! Por favor, insira um número válido.")
+    elif choice == '6':
+        batch_actions()
+    elif choice == '7':
+        print("\nSaindo...\n")
+        store.close()
+        return False
+    else:
+        print("\nOpção inválida! Tente novamente.")
+    return True
+
 # Função principal para exibir o menu
-def main():
+def main(profile_action=PROFILE_ACTION, profile_output=PROFILE_OUTPUT):
     print(""" 
          ___         _ __    _____ __                
         /   | ____ _(_) /__ / ___// /_____  ________ 
@@ -226,40 +372,30 @@ Menu:
 3. Buscar Produto
 4. Atualizar Produto
 5. Excluir Produto
-6. Sair
+6. Ações em Lote
+7. Sair
 """)
         choice = input("Escolha uma opção: ")
 
-        if choice == '1':
-            name = input("Nome do Produto: ")
-            category = input("Categoria: ")
-            try:
-                quantity = int(input("Quantidade em Estoque: "))
-                price = float(input("Preço: "))
-                add_product(name, category, quantity, price)
-            except ValueError:
-                print("\nEntrada inválida! Por favor, insira valores numéricos válidos para quantidade e preço.")
-        elif choice == '2':
-            list_products()
-        elif choice == '3':
-            search_product()
-        elif choice == '4':
-            try:
-                product_id = int(input("Digite o ID do produto a ser atualizado: "))
-                update_product(product_id)
-            except ValueError:
-                print("\nID inválido! Certifique-se de inserir um número válido.")
-        elif choice == '5':
-            try:
-                product_id = int(input("Digite o ID do produto a ser excluído: "))
-                delete_product(product_id)
-            except ValueError:
-                print("\nID inválido! Por favor, insira um número válido.")
-        elif choice == '6':
-            print("\nSaindo...\n")
-            break
+        # Relê o catálogo apenas se outro processo alterou o arquivo
+        store.refresh()
+
+        # Perfila a primeira execução da opção escolhida em --profile
+        if profile_action and choice == profile_action:
+            profile_action = None
+            running = metrics.profile(lambda: run_action(choice), profile_output)
         else:
-            print("\nOpção inválida! Tente novamente.")
+            running = run_action(choice)
+        if not running:
+            break
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Gerenciamento de Produtos da AgileStore.")
+    parser.add_argument('--metrics', action='store_true', help="Mede os trechos críticos e imprime um resumo ao sair")
+    parser.add_argument('--profile', metavar='OPÇÃO', default=PROFILE_ACTION,
+                        help="Perfila com o cProfile a primeira execução da opção do menu (ex.: 2)")
+    parser.add_argument('--profile-output', default=PROFILE_OUTPUT, help="Arquivo onde gravar o perfil")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    main(args.profile, args.profile_output)
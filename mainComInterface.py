@@ -1,71 +1,44 @@
+import math
+import sys
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
-import json
-import os
-
-# Caminho do arquivo JSON onde os produtos serão armazenados
-FILE_PATH = 'products.json'
-
-# Função para carregar os produtos do arquivo JSON
-def load_products():
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    else:
-        return []
-
-# Função para salvar os produtos no arquivo JSON
-def save_products(products):
-    with open(FILE_PATH, 'w', encoding='utf-8') as file:
-        json.dump(products, file, indent=4, ensure_ascii=False)
-
-# Função para obter o próximo ID disponível
-def get_next_id(products):
-    if products:
-        return max(product['id'] for product in products) + 1
-    else:
-        return 1
+
+import analytics
+import metrics
+from config import VIRTUAL_TABLE
+from indexes import SORT_KEYS
+from io_worker import BackgroundLoader, PersistenceWorker
+from product_store import ProductStore, adjust_price, set_field, validate_product
+from virtual_table import VirtualTreeview
+
+# Catálogo carregado uma única vez e mantido em memória.
+# As gravações são feitas pela thread de I/O, nunca na thread do Tk.
+store = ProductStore(autosave=False)
 
 # Função para adicionar um produto
 def add_product(name, category, quantity, price):
-    products = load_products()
-    product_id = get_next_id(products)
-    product = {
-        'id': product_id,
-        'name': name,
-        'category': category,
-        'quantity': quantity,
-        'price': price
-    }
-    products.append(product)
-    save_products(products)
+    return store.add(name, category, quantity, price)
 
 # Função para atualizar um produto
 def update_product(product_id, name=None, category=None, quantity=None, price=None):
-    products = load_products()
-    for product in products:
-        if product['id'] == product_id:
-            if name:
-                product['name'] = name
-            if category:
-                product['category'] = category
-            if quantity is not None:
-                product['quantity'] = quantity
-            if price is not None:
-                product['price'] = price
-            break
-    save_products(products)
+    changes = {}
+    if name:
+        changes['name'] = name
+    if category:
+        changes['category'] = category
+    if quantity is not None:
+        changes['quantity'] = quantity
+    if price is not None:
+        changes['price'] = price
+    return store.update(product_id, **changes)
 
 # Função para excluir um produto
 def delete_product(product_id):
-    products = load_products()
-    products = [product for product in products if product['id'] != product_id]
-    save_products(products)
+    return store.delete(product_id)
 
 # Função para buscar produtos por ID ou nome
 def search_products(query):
-    products = load_products()
-    return [product for product in products if query.lower() in str(product['id']).lower() or query.lower() in product['name'].lower()]
+    return store.search(query)
 
 # Função para aplicar estilos visuais
 def apply_styles():
@@ -88,8 +61,16 @@ class ProductManagerApp:
         self.root.resizable(True, True)
         self.root.minsize(600, 500)  # Limitar a redução mínima do tamanho da janela
 
-        self.products = load_products()
-        self.original_products = list(self.products)  # Para restaurar a ordem original
+        # O catálogo é carregado em segundo plano, em blocos: a janela abre vazia e vai
+        # sendo preenchida, e busca e filtro já funcionam sobre a parte carregada. O
+        # loader é criado antes da interface para que ela não dispare uma carga completa.
+        self.loader = BackgroundLoader(store, self.root, on_progress=self.on_load_progress, on_done=self.on_loaded)
+
+        # snapshot é a versão imutável do catálogo exibida (ordem original) e view, a
+        # projeção dele que está na tabela (o próprio snapshot, ou busca/filtro/ordenação)
+        self.snapshot = store.snapshot()
+        self.view = self.snapshot
+        self.is_filtered = False  # Se a tabela mostra só parte do catálogo (busca/filtro)
 
         # Aplicar estilos visuais
         apply_styles()
@@ -97,6 +78,10 @@ class ProductManagerApp:
         # Configuração da interface
         self.setup_ui()
 
+        # Gravação em segundo plano: a interface é atualizada antes do disco
+        self.worker = PersistenceWorker(store, self.root, on_done=self.on_saved)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def setup_ui(self):
         # Frame de entrada de dados
         input_frame = ttk.Frame(self.root, padding="10")
@@ -125,7 +110,9 @@ class ProductManagerApp:
         table_frame = ttk.Frame(self.root, padding="10")
         table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
-        self.tree = ttk.Treeview(table_frame, columns=("ID", "Nome", "Categoria", "Quantidade", "Preço"), show="headings")
+        # Tabela virtualizada: só as linhas visíveis são inseridas no Treeview
+        self.table = VirtualTreeview(table_frame, ("ID", "Nome", "Categoria", "Quantidade", "Preço"), self.format_row, virtual=VIRTUAL_TABLE)
+        self.tree = self.table.tree
         self.tree.heading("ID", text="ID")
         self.tree.heading("Nome", text="Nome")
         self.tree.heading("Categoria", text="Categoria")
@@ -140,9 +127,7 @@ class ProductManagerApp:
 
         self.tree.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
 
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # Botões de ações
         action_frame = ttk.Frame(self.root, padding="10")
@@ -163,35 +148,115 @@ class ProductManagerApp:
         reset_button = ttk.Button(action_frame, text="Restaurar Ordem Original", command=self.reset_order)
         reset_button.grid(row=0, column=4, padx=5)
 
+        batch_button = ttk.Button(action_frame, text="Ações em Lote", command=self.batch_actions)
+        batch_button.grid(row=0, column=5, padx=5)
+
+        # Resumo do estoque (totais materializados, sem percorrer o catálogo)
+        self.summary_label = ttk.Label(self.root, text="", padding="5")
+        self.summary_label.pack(fill=tk.X, padx=10)
+
+        # Barra de status das gravações e da carga do catálogo
+        self.status_label = ttk.Label(self.root, text="Carregando produtos...", padding="5")
+        self.status_label.pack(fill=tk.X, padx=10)
+        self.progress_bar = ttk.Progressbar(self.root, mode="determinate")
+        self.progress_bar.pack(fill=tk.X, padx=15, pady=(0, 5))
+
         self.populate_tree()
 
-    def populate_tree(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for product in self.products:
-            self.tree.insert("", "end", values=(product['id'], product['name'], product['category'], product['quantity'], f"R$ {product['price']:.2f}"))
+    def format_row(self, product):
+        return (product['id'], product['name'], product['category'], product['quantity'], f"R$ {product['price']:.2f}")
+
+    # Atualiza a tabela aplicando só as diferenças em relação ao que já está na tela
+    @metrics.timed('gui.populate_tree')
+    def populate_tree(self, reset_scroll=False):
+        self.table.set_rows(self.view, reset_scroll)
+        summary = analytics.totals(store)
+        self.summary_label.config(text=f"{summary['products']} produto(s) | {summary['quantity']} item(ns) em estoque | "
+                                       f"Valor em estoque: R$ {summary['value']:.2f}")
+
+    # Mostra o catálogo inteiro na ordem original: a visão é o próprio snapshot, sem cópia
+    def show_catalog(self, reset_scroll=False):
+        self.snapshot = store.snapshot()
+        self.view = self.snapshot
+        self.is_filtered = False
+        self.populate_tree(reset_scroll)
+
+    # Atualiza o snapshot; a tabela só troca de visão se não houver busca/filtro aplicado
+    def refresh_snapshot(self):
+        if self.is_filtered:
+            self.snapshot = store.snapshot()
+            self.populate_tree()
+        else:
+            self.show_catalog()
+
+    # Mostra na tabela os produtos carregados até agora
+    def on_load_progress(self, loaded, total):
+        self.refresh_snapshot()
+        self.progress_bar.config(maximum=total, value=loaded)
+        self.status_label.config(text=f"Carregando produtos... {loaded} de {total}")
+
+    def on_loaded(self, error):
+        self.progress_bar.pack_forget()
+        if error is not None:
+            self.status_label.config(text="Erro ao carregar os produtos.")
+            messagebox.showerror("Erro", f"Não foi possível carregar os produtos: {error}")
+            return
+        self.refresh_snapshot()
+        self.status_label.config(text=f"{len(self.snapshot)} produto(s) carregado(s).")
+
+    # Alterações só são permitidas depois que o catálogo inteiro foi carregado
+    def check_loaded(self):
+        if store.is_loading():
+            messagebox.showinfo("Aguarde", "Os produtos ainda estão sendo carregados. Tente novamente em instantes.")
+            return False
+        return True
+
+    # Agenda a gravação das alterações pendentes na thread de I/O
+    def request_save(self):
+        self.status_label.config(text="Salvando alterações...")
+        self.worker.submit()
+
+    def on_saved(self, written, error):
+        if error is not None:
+            self.status_label.config(text="Erro ao salvar as alterações.")
+            messagebox.showerror("Erro", f"Não foi possível salvar as alterações: {error}")
+        elif store.pending_count() == 0:
+            self.status_label.config(text="Todas as alterações foram salvas.")
+            if written and not self.is_filtered:
+                # A gravação pode ter trazido alterações feitas por outros processos
+                self.show_catalog()
+
+    def on_close(self):
+        # Grava o que ainda estiver pendente antes de fechar
+        self.worker.close()
+        store.close()
+        self.root.destroy()
 
     def add_product(self):
+        if not self.check_loaded():
+            return
         name = self.name_entry.get().strip()
         category = self.category_entry.get().strip()
         try:
             quantity = int(self.quantity_entry.get().strip())
             price = float(self.price_entry.get().strip())
-        except ValueError:
+        except (ValueError, OverflowError):
             messagebox.showerror("Erro", "Quantidade e preço devem ser valores numéricos válidos.")
             return
 
-        if not name or not category:
-            messagebox.showerror("Erro", "Nome e categoria não podem estar vazios.")
+        error = validate_product(name, category, quantity, price)
+        if error:
+            messagebox.showerror("Erro", error)
             return
 
         add_product(name, category, quantity, price)
-        self.products = load_products()
-        self.original_products = list(self.products)
-        self.populate_tree()
+        self.show_catalog()
+        self.request_save()
         messagebox.showinfo("Sucesso", "Produto adicionado com sucesso!")
 
     def update_product(self):
+        if not self.check_loaded():
+            return
         selected_item = self.tree.selection()
         if not selected_item:
             messagebox.showwarning("Aviso", "Selecione um produto para atualizar.")
@@ -206,15 +271,23 @@ class ProductManagerApp:
             try:
                 quantity = int(quantity_entry.get().strip()) if quantity_entry.get().strip() else None
                 price = float(price_entry.get().strip()) if price_entry.get().strip() else None
-            except ValueError:
+                if price is not None and not math.isfinite(price):
+                    raise ValueError
+            except (ValueError, OverflowError):
                 messagebox.showerror("Erro", "Quantidade e preço devem ser valores numéricos válidos.")
                 return
 
-            update_product(product_id, name, category, quantity, price)
-            self.products = load_products()
-            self.original_products = list(self.products)
-            self.populate_tree()
-            messagebox.showinfo("Sucesso", "Produto atualizado com sucesso!")
+            current = store.get(product_id)
+            product = update_product(product_id, name, category, quantity, price)
+            if product is None:
+                messagebox.showerror("Erro", "Produto não encontrado.")
+            elif product is current:
+                # Nenhum valor mudou: não há o que gravar
+                messagebox.showinfo("Aviso", "Nenhuma alteração foi feita.")
+            else:
+                self.show_catalog()
+                self.request_save()
+                messagebox.showinfo("Sucesso", "Produto atualizado com sucesso!")
             update_window.destroy()
 
         update_window = tk.Toplevel(self.root)
@@ -244,6 +317,8 @@ class ProductManagerApp:
         save_button.grid(row=4, columnspan=2, pady=10)
 
     def delete_product(self):
+        if not self.check_loaded():
+            return
         selected_item = self.tree.selection()
         if not selected_item:
             messagebox.showwarning("Aviso", "Selecione um produto para excluir.")
@@ -255,34 +330,46 @@ class ProductManagerApp:
         confirm = messagebox.askyesno("Confirmação", f"Deseja realmente excluir o produto ID {product_id}?")
         if confirm:
             delete_product(product_id)
-            self.products = load_products()
-            self.original_products = list(self.products)
-            self.populate_tree()
+            self.show_catalog()
+            self.request_save()
             messagebox.showinfo("Sucesso", "Produto excluído com sucesso!")
 
     def search_product(self):
         query = simpledialog.askstring("Buscar Produto", "Digite o ID ou parte do nome do produto:")
         if query:
-            self.products = search_products(query)
-            self.populate_tree()
+            self.snapshot = store.snapshot()
+            self.view = self.snapshot.view(search_products(query))
+            if not self.view:
+                # Nenhum ID ou nome contém o texto: mostra os nomes mais parecidos
+                self.view = self.snapshot.view(product for _, product in store.fuzzy_search(query))
+                if self.view:
+                    self.status_label.config(text=f"Nenhum produto contém \"{query}\"; mostrando nomes parecidos.")
+            self.is_filtered = True
+            self.populate_tree(reset_scroll=True)
 
     def filter_products(self):
         filter_window = tk.Toplevel(self.root)
         filter_window.title("Filtrar/Ordenar Produtos")
 
+        # Contagem de produtos por categoria, já mantida pelo índice de categorias
+        categories = store.categories()
+
         def apply_filter():
             criteria = filter_var.get()
-            if criteria == "name":
-                self.products.sort(key=lambda x: x['name'].lower())
-            elif criteria == "quantity":
-                self.products.sort(key=lambda x: x['quantity'])
-            elif criteria == "price":
-                self.products.sort(key=lambda x: x['price'])
-            elif criteria == "category":
-                category = category_entry.get().strip()
-                self.products = [p for p in self.original_products if category.lower() in p['category'].lower()]
+            category = category_entry.get().strip()
+            self.snapshot = store.snapshot()
+            if category:
+                self.view = self.snapshot.view(store.filter_category(category))
+                self.is_filtered = True
 
-            self.populate_tree()
+            if not self.is_filtered:
+                # Catálogo inteiro: a ordem vem pronta do índice ordenado
+                self.view = self.snapshot.view(store.sorted_by(criteria))
+            else:
+                # Ordena uma nova projeção; o snapshot e as outras visões não mudam
+                self.view = self.view.sorted(key=SORT_KEYS[criteria])
+
+            self.populate_tree(reset_scroll=True)
             filter_window.destroy()
 
         filter_var = tk.StringVar(value="name")
@@ -293,18 +380,117 @@ class ProductManagerApp:
         ttk.Radiobutton(filter_window, text="Preço", variable=filter_var, value="price").grid(row=3, column=0, pady=2)
 
         ttk.Label(filter_window, text="Filtrar por categoria:").grid(row=4, column=0, pady=5)
-        category_entry = ttk.Entry(filter_window)
+        category_entry = ttk.Combobox(filter_window, values=list(categories))
         category_entry.grid(row=5, column=0, pady=2)
 
+        count_label = ttk.Label(filter_window, text="")
+        count_label.grid(row=6, column=0, pady=2)
+
+        def show_count(event=None):
+            count = categories.get(category_entry.get())
+            count_label.config(text=f"{count} produto(s)" if count is not None else "")
+
+        category_entry.bind("<<ComboboxSelected>>", show_count)
+
         apply_button = ttk.Button(filter_window, text="Aplicar", command=apply_filter)
-        apply_button.grid(row=6, column=0, pady=10)
+        apply_button.grid(row=7, column=0, pady=10)
+
+    # Aplica uma alteração ou exclusão aos produtos selecionados ou a uma categoria inteira
+    def batch_actions(self):
+        if not self.check_loaded():
+            return
+        selected_ids = {int(self.tree.item(item)['values'][0]) for item in self.tree.selection()}
+        categories = store.categories()
+
+        batch_window = tk.Toplevel(self.root)
+        batch_window.title("Ações em Lote")
+
+        action_var = tk.StringVar(value="price")
+        ttk.Label(batch_window, text="Ação:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Radiobutton(batch_window, text="Reajustar preço (%)", variable=action_var, value="price").grid(row=1, column=0, sticky=tk.W, padx=5)
+        ttk.Radiobutton(batch_window, text="Definir quantidade", variable=action_var, value="quantity").grid(row=2, column=0, sticky=tk.W, padx=5)
+        ttk.Radiobutton(batch_window, text="Excluir", variable=action_var, value="delete").grid(row=3, column=0, sticky=tk.W, padx=5)
+
+        ttk.Label(batch_window, text="Valor:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        value_entry = ttk.Entry(batch_window)
+        value_entry.grid(row=5, column=0, padx=5)
+
+        target_var = tk.StringVar(value="selection" if selected_ids else "category")
+        ttk.Label(batch_window, text="Aplicar a:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Radiobutton(batch_window, text=f"Produtos selecionados ({len(selected_ids)})", variable=target_var,
+                        value="selection", state=tk.NORMAL if selected_ids else tk.DISABLED).grid(row=7, column=0, sticky=tk.W, padx=5)
+        ttk.Radiobutton(batch_window, text="Categoria:", variable=target_var, value="category").grid(row=8, column=0, sticky=tk.W, padx=5)
+        category_entry = ttk.Combobox(batch_window, values=list(categories))
+        category_entry.grid(row=9, column=0, padx=5)
+
+        def apply_batch():
+            action = action_var.get()
+            transform = None
+            try:
+                if action == "price":
+                    percent = float(value_entry.get().strip())
+                    if percent <= -100:
+                        raise ValueError
+                    transform = adjust_price(percent)
+                elif action == "quantity":
+                    quantity = int(value_entry.get().strip())
+                    if quantity < 0:
+                        raise ValueError
+                    transform = set_field('quantity', quantity)
+            except ValueError:
+                messagebox.showerror("Erro", "Informe um valor numérico válido.", parent=batch_window)
+                return
+
+            ids = category = None
+            if target_var.get() == "selection":
+                ids = selected_ids
+            else:
+                category = category_entry.get().strip()
+                if not category:
+                    messagebox.showerror("Erro", "Escolha uma categoria.", parent=batch_window)
+                    return
+
+            count = len(store.select(ids, category))
+            if not count:
+                messagebox.showinfo("Ações em Lote", "Nenhum produto encontrado.", parent=batch_window)
+                return
+            if not messagebox.askyesno("Confirmação", f"{count} produto(s) serão afetados. Confirmar?", parent=batch_window):
+                return
+
+            if transform is None:
+                changed = store.delete_many(ids, category)
+            else:
+                try:
+                    changed = store.update_many(transform, ids, category)
+                except ValueError as error:
+                    messagebox.showerror("Erro", f"{error} Nenhum produto foi alterado.", parent=batch_window)
+                    return
+            self.show_catalog()
+            self.request_save()
+            batch_window.destroy()
+            messagebox.showinfo("Sucesso", f"{len(changed)} produto(s) {'excluído(s)' if transform is None else 'atualizado(s)'} com sucesso!")
+
+        ttk.Button(batch_window, text="Aplicar", command=apply_batch).grid(row=10, column=0, pady=10)
 
     def reset_order(self):
-        self.products = list(self.original_products)
-        self.populate_tree()
+        # A ordem original é o próprio snapshot, sem cópia. Se outro processo alterou
+        # o arquivo, a releitura é feita na thread de I/O e a tabela é atualizada depois.
+        self.view = self.snapshot
+        self.is_filtered = False
+        self.populate_tree(reset_scroll=True)
+        if not store.is_loading():
+            self.worker.refresh(self.on_refreshed)
+
+    def on_refreshed(self, reloaded, error):
+        if error is not None:
+            messagebox.showerror("Erro", f"Não foi possível reler os produtos: {error}")
+        elif reloaded:
+            self.refresh_snapshot()
 
 # Inicializar a aplicação
 if __name__ == "__main__":
+    if '--metrics' in sys.argv[1:]:
+        metrics.enable()
     root = tk.Tk()
     app = ProductManagerApp(root)
     root.mainloop()
@@ -0,0 +1,130 @@
+import atexit
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+
+from config import METRICS
+
+# Instrumentação dos caminhos críticos (carga, gravação, busca e renderização).
+#
+# Desativada por padrão. Com AGILESTORE_METRICS=1 (ou a opção --metrics do
+# main.py e do mainComInterface.py) cada trecho instrumentado registra a
+# quantidade de chamadas, o tempo total e o maior tempo, além de contadores como
+# bytes lidos/gravados, linhas percorridas e linhas renderizadas. O resumo é
+# impresso na saída de erro quando o programa termina.
+#
+# Desligada, a instrumentação custa só a verificação de "metrics.enabled".
+#
+#     @metrics.timed('store.load')
+#     def load(self): ...
+#
+#     if metrics.enabled:
+#         metrics.count('load.parse_json', bytes_read=size)
+
+enabled = False
+_stats = {}  # nome -> {'calls': ..., 'total_s': ..., 'max_s': ..., contadores...}
+_lock = threading.Lock()  # A gravação da interface gráfica roda em outra thread
+
+
+# Função para ativar a instrumentação e imprimir o resumo ao sair
+def enable():
+    global enabled
+    if not enabled:
+        enabled = True
+        atexit.register(dump)
+
+
+def _entry(name):
+    entry = _stats.get(name)
+    if entry is None:
+        entry = _stats[name] = {'calls': 0, 'total_s': 0.0, 'max_s': 0.0}
+    return entry
+
+
+# Função para registrar uma chamada de "name" que levou "elapsed" segundos
+def record(name, elapsed):
+    with _lock:
+        entry = _entry(name)
+        entry['calls'] += 1
+        entry['total_s'] += elapsed
+        if elapsed > entry['max_s']:
+            entry['max_s'] = elapsed
+
+
+# Função para somar contadores (bytes_read=..., rows=...) ao trecho "name"
+def count(name, **counters):
+    with _lock:
+        entry = _entry(name)
+        for counter, value in counters.items():
+            entry[counter] = entry.get(counter, 0) + value
+
+
+# Decorador que mede o tempo de cada chamada da função quando a instrumentação está ativa
+def timed(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# Retorna uma cópia das estatísticas coletadas
+def summary():
+    with _lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+# Função para imprimir o resumo das estatísticas
+def dump(file=None):
+    file = file or sys.stderr
+    stats = summary()
+    if not stats:
+        return
+    print("\nInstrumentação (AgileStore):", file=file)
+    print("{:<24} | {:>8} | {:>11} | {:>11} | {:>11} | {}".format(
+        "Trecho", "Chamadas", "Total (ms)", "Média (ms)", "Máx. (ms)", "Contadores"), file=file)
+    print("=" * 100, file=file)
+    for name in sorted(stats):
+        entry = stats[name]
+        calls = entry.pop('calls')
+        total = entry.pop('total_s') * 1000
+        maximum = entry.pop('max_s') * 1000
+        counters = ", ".join(f"{counter}={value}" for counter, value in sorted(entry.items()))
+        if not calls:
+            # Trecho só com contadores, sem medição de tempo
+            print("{:<24} | {:>8} | {:>11} | {:>11} | {:>11} | {}".format(name, '-', '-', '-', '-', counters), file=file)
+            continue
+        print("{:<24} | {:>8} | {:>11.3f} | {:>11.3f} | {:>11.3f} | {}".format(
+            name, calls, total, total / calls, maximum, counters), file=file)
+
+
+# Função para executar fn() sob o cProfile; imprime as funções mais custosas e,
+# se output for informado, grava as estatísticas (para o snakeviz/pstats)
+def profile(fn, output=None, limit=25):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn)
+    finally:
+        if output:
+            profiler.dump_stats(output)
+            print(f"\nPerfil gravado em '{output}'.", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
+
+
+if METRICS:
+    enable()
@@ -0,0 +1,74 @@
+import contextlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Sem fcntl (ex.: Windows) o lock vale só dentro do processo
+    fcntl = None
+
+# Lock entre processos (advisory, com fcntl.flock) sobre um arquivo ".lock".
+#
+# Vários programas da AgileStore (terminal, interface gráfica, servidor) podem
+# gravar o mesmo catálogo ao mesmo tempo; os backends usam este lock para que só
+# um deles reescreva os arquivos por vez. O lock é reentrante por thread: quem já
+# o tem (exclusivo ou compartilhado) pode pedi-lo de novo sem travar, e as
+# threads do mesmo processo se revezam entre si.
+#
+#     lock = FileLock('products.json.lock')
+#     with lock:              # exclusivo, para gravar
+#         ...
+#     with lock.shared():     # compartilhado, para ler
+#         ...
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def _acquire(self, operation):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a')
+                fcntl.flock(self._file.fileno(), operation)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def _release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self._acquire(fcntl.LOCK_EX if fcntl is not None else None)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+    # Lock compartilhado: vários processos podem ler juntos, mas não enquanto um grava
+    @contextlib.contextmanager
+    def shared(self):
+        self._acquire(fcntl.LOCK_SH if fcntl is not None else None)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def close(self):
+        with self._thread_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Função para obter o caminho do arquivo de lock associado a um arquivo de dados
+def lock_path(path):
+    return path + '.lock'
@@ -0,0 +1,94 @@
+import sys
+
+from indexes import normalize
+
+# Representação compacta de um produto em memória.
+#
+# Um dicionário por produto custa centenas de bytes só de estrutura; um objeto
+# com __slots__ guarda os cinco campos em posições fixas e as categorias, que se
+# repetem em milhares de produtos, são internadas (uma única string por
+# categoria). A leitura continua igual à de um dicionário: product['name'],
+# product.get('price'), dict(product) e json.dumps(dict(product)) funcionam.
+#
+# name_key guarda o nome normalizado (sem acentos e sem diferenciar maiúsculas),
+# calculado uma vez e recalculado só quando o nome muda; os índices de busca e de
+# ordenação por nome compartilham essa mesma string.
+#
+# O ProductStore não altera um produto depois de publicá-lo: cada alteração cria
+# uma cópia com copy_with(), para que os snapshots do catálogo (ver
+# catalog_snapshot.py) continuem mostrando os valores da versão deles.
+
+FIELDS = ('id', 'name', 'category', 'quantity', 'price')
+_FIELD_SET = frozenset(FIELDS)
+
+
+class Product:
+    __slots__ = FIELDS + ('name_key',)
+
+    def __init__(self, id, name, category, quantity, price):
+        self.id = id
+        self.name = name
+        self.name_key = normalize(name)
+        self.category = sys.intern(category)
+        self.quantity = quantity
+        self.price = price
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['name'], data['category'], data['quantity'], data['price'])
+
+    def __getitem__(self, key):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        if key == 'category':
+            value = sys.intern(value)
+        elif key == 'name':
+            self.name_key = normalize(value)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in _FIELD_SET:
+            return default
+        return getattr(self, key)
+
+    # Altera vários campos de uma vez, como dict.update
+    def update(self, fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    # Retorna uma cópia com os campos alterados; o produto original não muda
+    def copy_with(self, fields):
+        product = Product.__new__(Product)
+        for slot in Product.__slots__:
+            setattr(product, slot, getattr(self, slot))
+        product.update(fields)
+        return product
+
+    def keys(self):
+        return FIELDS
+
+    def values(self):
+        return tuple(getattr(self, field) for field in FIELDS)
+
+    def items(self):
+        return tuple((field, getattr(self, field)) for field in FIELDS)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __contains__(self, key):
+        return key in _FIELD_SET
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __repr__(self):
+        return f"Product({self.to_dict()!r})"
@@ -0,0 +1,891 @@
+import bisect
+import contextlib
+import heapq
+import itertools
+import math
+import threading
+
+import metrics
+from analytics import InventoryStats
+from catalog_snapshot import ChunkedCatalog
+from change_feed import RELOADED, Change, DirtyRows, field_changes
+from config import FUZZY_LIMIT, ID_BLOCK_SIZE, LOAD_CHUNK_SIZE, SORTED_INDEXES
+from indexes import SORT_KEYS, CategoryIndex, SortedIndex, TrigramIndex
+from product import Product
+from storage import apply_record, create_backend
+
+# Catálogo de produtos mantido em memória.
+#
+# O catálogo é lido uma única vez do backend de armazenamento (ver storage.py);
+# depois disso as operações usam um dicionário id -> produto (na ordem de
+# inserção), então busca, atualização, exclusão e a alocação de IDs são O(1). O
+# próximo ID é um contador persistido pelo backend, para que IDs de produtos
+# excluídos nunca sejam reutilizados.
+#
+# Cada produto é um objeto Product compacto (ver product.py), lido como dicionário.
+# Os índices secundários (ver indexes.py) são atualizados a cada alteração.
+# Produtos já publicados não são alterados no lugar: cada alteração troca o
+# objeto por uma cópia, e snapshot() devolve uma versão imutável do catálogo que
+# compartilha com as demais tudo o que não mudou (ver catalog_snapshot.py).
+#
+# Com autosave=True (terminal) cada alteração é gravada na hora. Com
+# autosave=False (interface gráfica) as alterações ficam pendentes até flush(),
+# que pode ser chamado de outra thread: mutações e flush são protegidos por lock,
+# e as consultas também o usam, para não lerem um índice no meio de uma alteração
+# (inclusive durante a carga em blocos, feita por outra thread).
+# Só as linhas que mudaram são gravadas, com os campos alterados (ver
+# change_feed.py); uma alteração que não muda nenhum valor não gera gravação, e
+# quem assina o catálogo (subscribe) recebe cada alteração campo a campo.
+#
+# Outros processos podem gravar o mesmo catálogo: os IDs novos são reservados no
+# backend (allocate_ids) em blocos de ID_BLOCK_SIZE, entregues da memória; o
+# próximo bloco é reservado em segundo plano quando o atual está acabando, para
+# uma inclusão não esperar pelo disco, e os IDs que sobram são devolvidos em
+# close(). O flush() grava sob o lock do backend. Se outro processo
+# gravou desde a última leitura (a versão mudou), o catálogo é relido e as
+# alterações pendentes são reaplicadas por cima antes de gravar, em vez de
+# sobrescrever as dele.
+
+
+# Função para conferir se um número é finito: só floats podem ser infinitos ou NaN,
+# e math.isfinite() levanta OverflowError com inteiros grandes demais para um float
+def is_finite(value):
+    return not isinstance(value, float) or math.isfinite(value)
+
+
+# Função para validar os dados de um novo produto; retorna a mensagem de erro ou None
+def validate_product(name, category, quantity, price):
+    if not all([name.strip(), category.strip()]):
+        return "Nome e Categoria não podem estar vazios!"
+    if not is_finite(price):
+        return "Preço deve ser um número válido!"
+    if quantity <= 0 or price <= 0:
+        return "Quantidade e Preço devem ser maiores que zero!"
+    return None
+
+
+# Função para conferir quantidade e preço antes de alterar o catálogo: infinito ou
+# NaN quebrariam os totais em centavos (ver analytics.py) no meio da alteração
+def check_numbers(fields):
+    for field in ('quantity', 'price'):
+        value = fields.get(field)
+        if value is not None and not is_finite(value):
+            raise ValueError("Quantidade e preço devem ser números finitos.")
+
+
+# Função para aplicar registros de alteração (ver storage.apply_record) sobre os
+# produtos lidos do backend, sem alterar os dicionários originais
+def patched(products, records):
+    products_by_id = {product['id']: product for product in products}
+    for record in records:
+        if record['op'] == 'update' and record['id'] in products_by_id:
+            products_by_id[record['id']] = dict(products_by_id[record['id']])
+        apply_record(products_by_id, record)
+    return products_by_id.values()
+
+
+# Transformação para update_many: reajusta o preço em "percent" por cento. Um
+# desconto grande pode arredondar o preço para zero (ex.: -99,9% de 1,00): nesse
+# caso o lote inteiro é recusado, já que update_many só altera depois de calcular tudo
+def adjust_price(percent):
+    factor = 1 + percent / 100
+
+    def transform(product):
+        price = round(product['price'] * factor, 2)
+        if price <= 0:
+            raise ValueError(f"O reajuste deixaria o produto ID {product['id']} com preço zero.")
+        return {'price': price}
+    return transform
+
+
+# Transformação para update_many: define o mesmo valor de um campo em todos os produtos
+def set_field(field, value):
+    return lambda product: {field: value} if product[field] != value else None
+
+
+class ProductStore:
+    # backend: onde o catálogo é gravado; por padrão, o configurado em AGILESTORE_STORAGE
+    def __init__(self, backend=None, sorted_fields=SORTED_INDEXES, autosave=True, id_block_size=ID_BLOCK_SIZE):
+        self.backend = backend if backend is not None else create_backend()
+        self.backend.on_compacted = self._remember_version
+        self._version = None  # Versão dos dados gravados na última leitura/gravação
+        # refresh() que não releram (a versão gravada não mudou) e que releram o catálogo
+        self.refresh_skips = 0
+        self.refresh_loads = 0
+        self.autosave = autosave
+        self.lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # Garante que as gravações saiam na ordem
+        self._products = {}
+        self._next_id = 1
+        self.id_block_size = id_block_size
+        self._id_lock = threading.Lock()  # Protege os blocos de IDs reservados
+        self._id_blocks = []  # Blocos [primeiro, fim) de IDs reservados e ainda não usados
+        self._refill_thread = None  # Thread que reserva o próximo bloco, se houver
+        self._dirty = DirtyRows()  # Linhas alteradas e ainda não gravadas
+        self._listeners = []  # Assinantes das alterações (subscribe)
+        self._loaded = False
+        self._catalog = ChunkedCatalog()  # Ordem de inserção, em blocos, para os snapshots
+        self._mutations = 0  # Versão do catálogo em memória, incrementada a cada alteração
+        self._snapshot = None  # Snapshot da versão atual, criado sob demanda
+        # Limpo enquanto load_in_chunks() carrega: gravar um catálogo parcial perderia dados
+        self._load_complete = threading.Event()
+        self._load_complete.set()
+
+        self.sorted_fields = sorted_fields
+        self._install_indexes(self._create_indexes())
+
+    # Cria os índices vazios: (nome, ID, categorias, totais, {campo: índice ordenado})
+    def _create_indexes(self):
+        return (
+            # Índices de trigramas para busca por parte do nome ou do ID
+            TrigramIndex(lambda product: product.name_key,
+                         lambda product_id: self._products[product_id].name_key, fields=('name',)),
+            TrigramIndex(lambda product: str(product['id']), str),
+            # Índice de categorias com a contagem de produtos de cada uma
+            CategoryIndex(),
+            # Totais de estoque (valor, quantidades, por categoria) ajustados a cada alteração
+            InventoryStats(),
+            # Índices ordenados opcionais por nome, quantidade e preço
+            {field: SortedIndex(field) for field in self.sorted_fields},
+        )
+
+    def _install_indexes(self, indexes):
+        self.name_index, self.id_index, self.category_index, self.stats, self.sorted_indexes = indexes
+        self._indexes = [self.name_index, self.id_index, self.category_index, self.stats]
+        self._indexes.extend(self.sorted_indexes.values())
+
+    # Monta, fora do lock, o dicionário de produtos, os índices e o catálogo em
+    # blocos a partir dos produtos lidos do backend
+    def _build(self, products):
+        products = {product['id']: Product.from_dict(product) for product in products}
+        indexes = self._create_indexes()
+        for index in itertools.chain(indexes[:4], indexes[4].values()):
+            index.rebuild(products.values())
+        catalog = ChunkedCatalog()
+        catalog.rebuild(products.values())
+        return products, indexes, catalog
+
+    # Troca o catálogo em memória pelo montado em _build() (chamado sob self.lock)
+    def _install(self, built):
+        self._products, indexes, self._catalog = built
+        self._install_indexes(indexes)
+        self._changed([RELOADED])
+
+    # Carrega o catálogo do backend e monta os índices. O catálogo e os índices
+    # novos são montados fora do lock (as consultas continuam usando os atuais) e
+    # trocados de uma vez; se o catálogo for alterado nesse meio-tempo, a releitura
+    # é descartada e load() retorna False (o próximo refresh() tenta de novo).
+    @metrics.timed('store.load')
+    def load(self):
+        with self.lock:
+            mutations = self._mutations
+        # A versão é lida antes dos dados: se outro processo gravar entre as duas
+        # leituras, a versão guardada fica para trás e o próximo refresh() relê
+        version = self.backend.version()
+        products, next_id = self.backend.load()
+        if metrics.enabled:
+            metrics.count('store.load', rows=len(products))
+        built = self._build(products)
+        with self.lock:
+            if self._loaded and self._mutations != mutations:
+                return False
+            self._install(built)
+            self._next_id = next_id
+            self._loaded = True
+            self._version = version
+        self._prefetch_ids()
+        return True
+
+    # Carrega o catálogo em blocos, para a interface gráfica abrir antes do fim da carga.
+    # Os produtos de cada bloco ficam visíveis (e pesquisáveis) assim que são indexados;
+    # on_chunk(carregados, total) é chamado, na thread que carrega, após cada bloco.
+    # Alterações e gravações esperam a carga terminar.
+    @metrics.timed('store.load')
+    def load_in_chunks(self, chunk_size=LOAD_CHUNK_SIZE, on_chunk=None):
+        self.begin_load()
+        try:
+            version = self.backend.version()
+            products, next_id = self.backend.load()
+            if metrics.enabled:
+                metrics.count('store.load', rows=len(products))
+            with self.lock:
+                self._products = {}
+                for index in self._indexes:
+                    index.rebuild(())
+                self._catalog.rebuild(())
+                self._changed([RELOADED])
+                self._next_id = next_id
+                self._loaded = True
+                self._version = version
+
+            total = len(products)
+            for start in range(0, total, chunk_size):
+                chunk = [Product.from_dict(product) for product in products[start:start + chunk_size]]
+                with self.lock:
+                    for product in chunk:
+                        self._products[product['id']] = product
+                    for index in self._indexes:
+                        index.extend(chunk)
+                    self._catalog.extend(chunk)
+                    self._changed(self._listeners and [Change(product['id'], None, None, product) for product in chunk])
+                if on_chunk is not None:
+                    on_chunk(min(start + chunk_size, total), total)
+        finally:
+            self._load_complete.set()
+        self._prefetch_ids()
+
+    # Marca o catálogo como "em carga" antes de a thread de carga começar, para que
+    # as consultas feitas nesse meio-tempo não disparem uma segunda carga
+    def begin_load(self):
+        self._load_complete.clear()
+
+    # Indica se load_in_chunks() ainda está carregando
+    def is_loading(self):
+        return not self._load_complete.is_set()
+
+    # Marca uma nova versão do catálogo em memória e publica as alterações para os
+    # assinantes (chamado sob self.lock)
+    def _changed(self, changes=()):
+        self._mutations += 1
+        self._snapshot = None
+        if changes:
+            for listener in list(self._listeners):
+                listener(changes)
+
+    # Assina as alterações do catálogo: listener(changes) recebe a lista de
+    # Change(id, campo, anterior, novo) de cada alteração (ver change_feed.py).
+    # É chamado sob o lock do store, logo depois da alteração, e deve ser rápido.
+    def subscribe(self, listener):
+        with self.lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self.lock:
+            self._listeners.remove(listener)
+
+    # Converte as alterações de campo de um produto ({campo: (anterior, novo)}) em Change
+    def _field_events(self, product_id, changes):
+        return [Change(product_id, field, old, new) for field, (old, new) in changes.items()]
+
+    # Índices que dependem de algum dos campos alterados
+    def _indexes_for(self, changes):
+        return [index for index in self._indexes if any(field in changes for field in index.fields)]
+
+    # Registra que os dados gravados correspondem ao que está em memória
+    def _remember_version(self):
+        with self.lock:
+            self._version = self.backend.version()
+
+    # Recarrega o catálogo só se outro processo alterou os dados desde a última
+    # leitura ou gravação; retorna True se recarregou
+    def refresh(self):
+        if not self._loaded:
+            self.load()
+            return True
+        if self._dirty or self.is_loading():
+            # Não descarta alterações que ainda não foram gravadas nem interrompe a carga
+            return False
+        if self.backend.version() == self._version:
+            self.refresh_skips += 1
+            return False
+        self.refresh_loads += 1
+        return self.load()
+
+    # Durante load_in_chunks() as consultas veem a parte já carregada; as alterações
+    # (complete=True) esperam a carga terminar, para não tocar em produtos que ainda
+    # não chegaram nem reutilizar IDs
+    def _ensure_loaded(self, complete=False):
+        if complete:
+            self._load_complete.wait()
+        if not self._loaded and not self.is_loading():
+            self.load()
+
+    # Lista dos produtos atuais, para backends que gravam o catálogo inteiro
+    def _snapshot_products(self):
+        with self.lock:
+            return list(self._products.values())
+
+    def close(self):
+        self.flush()
+        self._release_ids()
+        self.backend.close()
+
+    # Grava na hora se autosave estiver ativo (fora do lock das mutações)
+    def _flush_if_autosave(self):
+        if self.autosave:
+            self.flush()
+
+    # Agrupa várias alterações em uma única gravação ao final do bloco:
+    #     with store.batch():
+    #         ...
+    @contextlib.contextmanager
+    def batch(self):
+        autosave, self.autosave = self.autosave, False
+        try:
+            yield self
+        finally:
+            self.autosave = autosave
+        self._flush_if_autosave()
+
+    # Quantidade de produtos com alterações ainda não gravadas
+    def pending_count(self):
+        return len(self._dirty)
+
+    # Grava todas as alterações pendentes de uma vez; retorna quantos registros
+    # (produtos incluídos, alterados ou excluídos) foram gravados
+    @metrics.timed('store.flush')
+    def flush(self):
+        if self._dirty:
+            # Nunca grava um catálogo carregado pela metade
+            self._load_complete.wait()
+        with self._flush_lock:
+            with self.lock:
+                dirty, self._dirty = self._dirty, DirtyRows()
+                next_id = self._next_id
+            pending = dirty.records()
+            if not pending:
+                return 0
+            if metrics.enabled:
+                metrics.count('store.flush', rows=len(pending))
+            try:
+                if self.backend.spool is not None:
+                    self._group_commit(pending, next_id)
+                else:
+                    with self.backend.lock:
+                        if self.backend.version() != self._version:
+                            self._rebase(pending)
+                        self.backend.commit(pending, self._snapshot_products, next_id)
+                        self._remember_version()
+            except Exception:
+                # Devolve as alterações para a fila, para tentar de novo no próximo flush
+                with self.lock:
+                    dirty.merge(self._dirty)
+                    self._dirty = dirty
+                raise
+            return len(pending)
+
+    # Group commit entre processos: o lote entra na fila compartilhada do backend e
+    # quem consegue o lock grava os lotes de todos os processos de uma vez
+    def _group_commit(self, pending, next_id):
+        spool = self.backend.spool
+        token = spool.append(pending)
+        with self.backend.lock:
+            batches, size = spool.read()
+            if all(batch_token != token for batch_token, _ in batches):
+                # Outro processo já gravou este lote junto com os dele
+                if metrics.enabled:
+                    metrics.count('store.group_commit', followed=1)
+                return
+            if len(batches) > 1 or self.backend.version() != self._version:
+                self._rebase()
+            records = [record for _, batch in batches for record in batch]
+            self.backend.commit(records, self._snapshot_products, next_id)
+            spool.discard(size)
+            self._remember_version()
+        if metrics.enabled:
+            metrics.count('store.group_commit', led=1, batches=len(batches))
+
+    # Relê o catálogo gravado por outros processos e reaplica por cima as alterações
+    # deste processo que ainda não foram gravadas (as do flush atual e as seguintes).
+    # Como em load(), o catálogo novo é montado fora do lock e trocado de uma vez; as
+    # alterações feitas nesse meio-tempo chegam pelo change feed e são reaplicadas
+    # sobre ele antes da troca.
+    def _rebase(self, pending=()):
+        products, next_id = self.backend.load()
+        changes = []
+        listener = changes.extend
+        with self.lock:
+            records = list(itertools.chain(pending, self._dirty.records()))
+            self._listeners.append(listener)
+        try:
+            built = self._build(patched(products, records))
+        finally:
+            with self.lock:
+                self._listeners.remove(listener)
+        with self.lock:
+            if RELOADED in changes:
+                # O catálogo foi trocado no meio: monta de novo sob o lock (raro)
+                records = itertools.chain(pending, self._dirty.records())
+                built = self._build(patched(products, records))
+            else:
+                self._replay(built, changes)
+            self._install(built)
+            self._next_id = max(self._next_id, next_id)
+        if metrics.enabled:
+            metrics.count('store.rebase', rows=len(products), replayed=len(changes))
+
+    # Aplica ao catálogo montado em _build() as alterações publicadas depois que
+    # ele começou a ser montado (chamado sob self.lock)
+    def _replay(self, built, changes):
+        products, indexes, catalog = built
+        indexes = list(itertools.chain(indexes[:4], indexes[4].values()))
+        for change in changes:
+            product = products.get(change.id)
+            if change.field is None and change.new is None:
+                if product is not None:
+                    for index in indexes:
+                        index.remove(product)
+                    del products[change.id]
+                    catalog.remove(change.id)
+            elif change.field is None:
+                products[change.id] = change.new
+                for index in indexes:
+                    index.add(change.new)
+                catalog.append(change.new)
+            elif product is not None:
+                # Só o campo alterado: os demais podem ter vindo de outro processo
+                new_product = product.copy_with({change.field: change.new})
+                changed = [index for index in indexes if change.field in index.fields]
+                for index in changed:
+                    index.remove(product)
+                products[change.id] = new_product
+                for index in changed:
+                    index.add(new_product)
+                catalog.replace(new_product)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._products)
+
+    def __iter__(self):
+        self._ensure_loaded()
+        with self.lock:
+            return iter(list(self._products.values()))
+
+    # Retorna o catálogo atual como um snapshot imutável, na ordem de inserção.
+    # Enquanto nada muda o mesmo snapshot é devolvido; depois de uma alteração o
+    # novo reaproveita todos os blocos que não mudaram.
+    def snapshot(self):
+        self._ensure_loaded()
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = self._catalog.snapshot(self._mutations)
+            return self._snapshot
+
+    # Retorna uma lista com todos os produtos, na ordem de inserção
+    def all(self):
+        self._ensure_loaded()
+        with self.lock:
+            return list(self._products.values())
+
+    # Gera todos os produtos na ordem de inserção, sem copiar o catálogo
+    # (o catálogo não deve ser alterado durante a iteração)
+    def iter_all(self):
+        self._ensure_loaded()
+        yield from self._products.values()
+
+    # Retorna o produto com o ID informado, ou None
+    def get(self, product_id):
+        self._ensure_loaded()
+        return self._products.get(product_id)
+
+    # Busca produtos cujo nome contém o texto informado
+    @metrics.timed('store.search_name')
+    def search_name(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            return self._products_for(self.name_index.search(query))
+
+    # Busca produtos cujo ID ou nome contém o texto informado
+    @metrics.timed('store.search')
+    def search(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            return self._products_for(self.id_index.search(query) | self.name_index.search(query))
+
+    # Busca aproximada por nome, sem diferenciar acentos e maiúsculas e tolerando
+    # erros de digitação; retorna até "limit" pares (similaridade, produto), do mais
+    # parecido para o menos
+    @metrics.timed('store.fuzzy_search')
+    def fuzzy_search(self, query, limit=FUZZY_LIMIT):
+        self._ensure_loaded()
+        with self.lock:
+            return [(score, self._products[product_id]) for score, product_id in self.name_index.fuzzy(query, limit)]
+
+    # Retorna {categoria: quantidade de produtos} sem percorrer o catálogo
+    def categories(self):
+        self._ensure_loaded()
+        with self.lock:
+            return self.category_index.counts()
+
+    # Retorna os totais de estoque materializados (ver analytics.py)
+    def inventory(self):
+        self._ensure_loaded()
+        return self.stats
+
+    # Retorna os produtos cuja categoria contém o texto informado
+    @metrics.timed('store.filter_category')
+    def filter_category(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            return self._products_for(self.category_index.search(query))
+
+    # Retorna os produtos ordenados pelo campo ('name', 'quantity' ou 'price')
+    @metrics.timed('store.sorted_by')
+    def sorted_by(self, field, reverse=False):
+        self._ensure_loaded()
+        with self.lock:
+            # O índice é lido sob o lock: a carga e a releitura instalam índices novos
+            index = self.sorted_indexes.get(field)
+            if index is not None:
+                return [self._products[product_id] for product_id in index.ids(reverse)]
+            products = list(self._products.values())
+        return sorted(products, key=SORT_KEYS[field], reverse=reverse)
+
+    # Gera os produtos na ordem do campo, começando depois do cursor (chave, ID) de
+    # uma página anterior. Com índice ordenado o índice é lido aos poucos; sem ele,
+    # a ordem é calculada uma vez só com as chaves.
+    def iter_sorted(self, field, reverse=False, after=None):
+        self._ensure_loaded()
+        if field in self.sorted_indexes:
+            entries = self._iter_index(field, after, reverse)
+        else:
+            key_func = SORT_KEYS[field]
+            with self.lock:
+                entries = sorted((key_func(product), product['id']) for product in self._products.values())
+            if reverse:
+                end = len(entries) if after is None else bisect.bisect_left(entries, tuple(after))
+                entries = reversed(entries[:end])
+            else:
+                entries = entries[0 if after is None else bisect.bisect_right(entries, tuple(after)):]
+        for _, product_id in entries:
+            product = self._products.get(product_id)
+            if product is not None:
+                yield product
+
+    # Percorre as entradas (chave, ID) de um índice ordenado em lotes lidos sob
+    # self.lock; cada lote continua do cursor do anterior, então uma alteração (ou a
+    # carga em blocos) entre dois lotes não faz a listagem pular nem repetir entradas.
+    # O índice é buscado a cada lote, já que uma releitura instala índices novos.
+    def _iter_index(self, field, after=None, reverse=False, batch_size=256):
+        while True:
+            with self.lock:
+                batch = list(itertools.islice(self.sorted_indexes[field].iter_from(after, reverse), batch_size))
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
+    # Retorna o cursor (chave, ID) que continua a listagem depois do produto informado
+    def cursor_for(self, field, product):
+        return (SORT_KEYS[field](product), product['id'])
+
+    # Retorna uma página da listagem ordenada e o cursor da próxima (None se acabou)
+    def page(self, field, limit, after=None, reverse=False):
+        products = list(itertools.islice(self.iter_sorted(field, reverse, after), limit + 1))
+        if len(products) > limit:
+            products = products[:limit]
+            return products, self.cursor_for(field, products[-1])
+        return products, None
+
+    # Gera os produtos com os IDs informados, em ordem de ID, sem montar a lista de produtos
+    def _iter_products(self, product_ids):
+        for product_id in sorted(product_ids):
+            product = self._products.get(product_id)
+            if product is not None:
+                yield product
+
+    # Gera os produtos cujo nome contém o texto informado
+    def iter_search_name(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            product_ids = self.name_index.search(query)
+        return self._iter_products(product_ids)
+
+    # Gera os produtos cujo ID ou nome contém o texto informado
+    def iter_search(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            product_ids = self.id_index.search(query) | self.name_index.search(query)
+        return self._iter_products(product_ids)
+
+    # Gera os produtos cuja categoria contém o texto informado
+    def iter_category(self, query):
+        self._ensure_loaded()
+        with self.lock:
+            product_ids = self.category_index.search(query)
+        return self._iter_products(product_ids)
+
+    # Retorna os produtos com low <= campo <= high, em ordem crescente do campo
+    def range(self, field, low=None, high=None):
+        self._ensure_loaded()
+        key_func = SORT_KEYS[field]
+        with self.lock:
+            index = self.sorted_indexes.get(field)
+            if index is not None:
+                return [self._products[product_id] for product_id in index.range(low, high)]
+            matches = [product for product in self._products.values()
+                       if (low is None or key_func(product) >= low) and (high is None or key_func(product) <= high)]
+        return sorted(matches, key=key_func)
+
+    # Gera os produtos com low <= campo <= high, em ordem crescente do campo
+    def iter_range(self, field, low=None, high=None):
+        self._ensure_loaded()
+        if field not in self.sorted_indexes:
+            yield from self.range(field, low, high)
+            return
+        # (low,) fica antes de qualquer (low, ID), então a listagem começa no primeiro produto >= low
+        for key, product_id in self._iter_index(field, None if low is None else (low,)):
+            if high is not None and key > high:
+                break
+            product = self._products.get(product_id)
+            if product is not None:
+                yield product
+
+    # Retorna os k produtos com os menores (ou maiores) valores do campo
+    def top(self, field, k, largest=False):
+        # k negativo não seleciona nada (um fatiamento com k negativo pegaria quase tudo)
+        k = max(0, k)
+        self._ensure_loaded()
+        select = heapq.nlargest if largest else heapq.nsmallest
+        with self.lock:
+            index = self.sorted_indexes.get(field)
+            if index is not None:
+                return [self._products[product_id] for product_id in index.top(k, largest)]
+            return select(k, self._products.values(), key=SORT_KEYS[field])
+
+    # Converte um conjunto de IDs em produtos, na ordem dos IDs
+    def _products_for(self, product_ids):
+        return [self._products[product_id] for product_id in sorted(product_ids)]
+
+    # Reserva o próximo ID disponível
+    def allocate_id(self):
+        return self._take_ids(1)[0]
+
+    # Entrega "count" IDs dos blocos já reservados, em ordem crescente. Só reserva no
+    # backend, na thread de quem chamou, se eles não bastarem (primeira inclusão de
+    # um processo sem reserva adiantada ou uma importação grande).
+    def _take_ids(self, count):
+        self._ensure_loaded(complete=True)
+        with self._id_lock:
+            available = sum(end - start for start, end in self._id_blocks)
+            if available < count:
+                size = max(count - available, self.id_block_size)
+                self._add_id_block(self.backend.allocate_ids(size, self._next_id), size)
+            ids = []
+            while len(ids) < count:
+                block = self._id_blocks[0]
+                taken = min(count - len(ids), block[1] - block[0])
+                ids.extend(range(block[0], block[0] + taken))
+                block[0] += taken
+                if block[0] == block[1]:
+                    self._id_blocks.pop(0)
+            self._refill_if_low()
+        return ids
+
+    # Registra um bloco reservado (chamado sob self._id_lock)
+    def _add_id_block(self, first_id, size):
+        self._id_blocks.append([first_id, first_id + size])
+        self._id_blocks.sort()
+        # Sem self.lock: quem já o tem pode estar esperando por self._id_lock
+        self._next_id = max(self._next_id, first_id + size)
+
+    # Reserva o próximo bloco em segundo plano quando restar menos de meio bloco
+    # (chamado sob self._id_lock)
+    def _refill_if_low(self):
+        available = sum(end - start for start, end in self._id_blocks)
+        if self._refill_thread is None and available <= self.id_block_size // 2:
+            self._refill_thread = threading.Thread(target=self._refill_ids, daemon=True)
+            self._refill_thread.start()
+
+    def _refill_ids(self):
+        size = self.id_block_size
+        try:
+            first_id = self.backend.allocate_ids(size, self._next_id)
+        except Exception:
+            # Sem reserva adiantada: a próxima inclusão reserva na hora (e mostra o erro)
+            first_id = None
+        with self._id_lock:
+            if first_id is not None:
+                self._add_id_block(first_id, size)
+            self._refill_thread = None
+
+    # Depois da carga, adianta a reserva de IDs para quem grava fora da thread da
+    # interface (autosave=False: interface gráfica e servidor)
+    def _prefetch_ids(self):
+        if not self.autosave:
+            with self._id_lock:
+                self._refill_if_low()
+
+    # Devolve ao backend os IDs reservados que não foram usados
+    def _release_ids(self):
+        thread = self._refill_thread
+        if thread is not None:
+            thread.join()
+        with self._id_lock:
+            # Do último bloco para o primeiro: cada devolução só vale se o contador
+            # ainda estiver no fim do bloco
+            for first_id, end in reversed(self._id_blocks):
+                self.backend.release_ids(first_id, end)
+            self._id_blocks = []
+
+    # Adiciona um novo produto e retorna o produto criado
+    def add(self, name, category, quantity, price):
+        check_numbers({'quantity': quantity, 'price': price})
+        product = Product(self.allocate_id(), name, category, quantity, price)
+        with self.lock:
+            self._products[product['id']] = product
+            for index in self._indexes:
+                index.add(product)
+            self._catalog.append(product)
+            self._dirty.added(product)
+            self._changed([Change(product['id'], None, None, product)])
+        self._flush_if_autosave()
+        return product
+
+    # Adiciona vários produtos (dicionários sem 'id') alocando os IDs de uma vez;
+    # retorna os produtos criados
+    def add_many(self, rows):
+        for row in rows:
+            check_numbers(row)
+        ids = self._take_ids(len(rows))
+        with self.lock:
+            products = []
+            for product_id, row in zip(ids, rows):
+                product = Product(product_id, row['name'], row['category'], row['quantity'], row['price'])
+                self._products[product_id] = product
+                products.append(product)
+                self._dirty.added(product)
+
+            # Lotes grandes: reconstruir os índices sai mais barato do que inserir um a um
+            rebuild = len(products) > len(self._products) // 10
+            for index in self._indexes:
+                if rebuild:
+                    index.rebuild(self._products.values())
+                else:
+                    for product in products:
+                        index.add(product)
+            self._catalog.extend(products)
+            self._changed(self._listeners and [Change(product['id'], None, None, product) for product in products])
+        self._flush_if_autosave()
+        return products
+
+    # Seleciona produtos por conjunto de IDs, categoria (nome exato, pelo índice de
+    # categorias) e/ou predicado; sem critérios, seleciona o catálogo inteiro
+    def select(self, ids=None, category=None, predicate=None):
+        self._ensure_loaded()
+        with self.lock:
+            if ids is not None:
+                selected = {product_id for product_id in ids if product_id in self._products}
+                if category is not None:
+                    selected &= self.category_index.ids(category)
+            elif category is not None:
+                selected = self.category_index.ids(category)
+            else:
+                selected = self._products.keys()
+            products = self._products_for(selected)
+        if predicate is not None:
+            products = [product for product in products if predicate(product)]
+        return products
+
+    # Aplica transform(produto) -> {campo: valor} (ou None para não alterar) a todos os
+    # produtos selecionados, em uma única passada e com uma única gravação; retorna
+    # os produtos que realmente mudaram
+    def update_many(self, transform, ids=None, category=None, predicate=None):
+        self._ensure_loaded(complete=True)
+        with self.lock:
+            changes = []
+            # Calcula todas as alterações antes de aplicar: se transform falhar, nada muda
+            for product in self.select(ids, category, predicate):
+                fields = transform(product)
+                if fields:
+                    check_numbers(fields)
+                    product_changes = field_changes(product, fields)
+                    if product_changes:
+                        changes.append((product, product_changes))
+            if not changes:
+                return []
+            rebuild = len(changes) > len(self._products) // 10
+            updated = []
+            events = []
+            for product, product_changes in changes:
+                indexes = () if rebuild else self._indexes_for(product_changes)
+                for index in indexes:
+                    index.remove(product)
+                new_product = product.copy_with({field: new for field, (_, new) in product_changes.items()})
+                self._products[product['id']] = new_product
+                updated.append(new_product)
+                for index in indexes:
+                    index.add(new_product)
+                if not rebuild:
+                    self._catalog.replace(new_product)
+                self._dirty.updated(product['id'], product_changes)
+                if self._listeners:
+                    events.extend(self._field_events(product['id'], product_changes))
+            # Lotes grandes: reconstruir os índices sai mais barato do que atualizar um a um
+            if rebuild:
+                for index in self._indexes:
+                    index.rebuild(self._products.values())
+                self._catalog.rebuild(self._products.values())
+            self._changed(events)
+        self._flush_if_autosave()
+        return updated
+
+    # Exclui todos os produtos selecionados com uma única gravação; retorna os produtos excluídos
+    def delete_many(self, ids=None, category=None, predicate=None):
+        if ids is None and category is None and predicate is None:
+            raise ValueError("Informe os IDs, a categoria ou um critério para a exclusão em lote.")
+        self._ensure_loaded(complete=True)
+        with self.lock:
+            products = self.select(ids, category, predicate)
+            rebuild = len(products) > len(self._products) // 10
+            for product in products:
+                del self._products[product['id']]
+                if not rebuild:
+                    for index in self._indexes:
+                        index.remove(product)
+                    self._catalog.remove(product['id'])
+                self._dirty.deleted(product['id'])
+            if rebuild:
+                for index in self._indexes:
+                    index.rebuild(self._products.values())
+                self._catalog.rebuild(self._products.values())
+            if products:
+                self._changed([Change(product['id'], None, product, None) for product in products])
+        self._flush_if_autosave()
+        return products
+
+    # Atualiza os campos informados de um produto; retorna o produto atualizado ou
+    # None se não existir. Se nenhum valor muda, nada é gravado e o próprio produto
+    # atual é devolvido (store.update(...) is produto indica que não houve alteração).
+    def update(self, product_id, **fields):
+        self._ensure_loaded(complete=True)
+        with self.lock:
+            product = self._products.get(product_id)
+            if product is None:
+                return None
+            check_numbers(fields)
+            changes = field_changes(product, fields)
+            if not changes:
+                return product
+            # Cópia em vez de alteração no lugar: snapshots anteriores não mudam.
+            # Calculada antes de mexer nos índices, para um erro não deixá-los pela metade.
+            new_product = product.copy_with({field: new for field, (_, new) in changes.items()})
+            # Só os índices dos campos alterados são atualizados
+            indexes = self._indexes_for(changes)
+            for index in indexes:
+                index.remove(product)
+            product = new_product
+            self._products[product_id] = product
+            for index in indexes:
+                index.add(product)
+            self._catalog.replace(product)
+            self._dirty.updated(product_id, changes)
+            self._changed(self._field_events(product_id, changes))
+        self._flush_if_autosave()
+        return product
+
+    # Exclui um produto; retorna o produto excluído ou None se não existir
+    def delete(self, product_id):
+        self._ensure_loaded(complete=True)
+        with self.lock:
+            product = self._products.pop(product_id, None)
+            if product is None:
+                return None
+            for index in self._indexes:
+                index.remove(product)
+            self._catalog.remove(product_id)
+            self._dirty.deleted(product_id)
+            self._changed([Change(product_id, None, product, None)])
+        self._flush_if_autosave()
+        return product
@@ -0,0 +1,446 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import heapq
+import itertools
+import json
+import math
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from config import FUZZY_LIMIT, GROUP_COMMIT_DELAY, SERVER_HOST, SERVER_PORT
+from indexes import SORT_KEYS
+from product_store import ProductStore, validate_product
+
+# Servidor HTTP/JSON do catálogo (somente biblioteca padrão, com asyncio).
+#
+# Todos os clientes compartilham o mesmo catálogo em memória: as leituras nunca
+# releem o products.json. As escritas alteram o catálogo na hora, na thread do
+# servidor, e a resposta só é enviada depois que a alteração foi gravada. As
+# escritas que chegam juntas são agrupadas em um único flush() do store (group
+# commit), feito fora do loop de eventos e sempre um de cada vez.
+#
+# Rotas:
+#     GET    /products?q=&category=&sort=name|quantity|price&order=desc&limit=&offset=
+#     GET    /products?sort=price&limit=50&cursor=<next_cursor da página anterior>
+#     GET    /products/search?q=texto
+#     GET    /products/search?q=texto&fuzzy=1&limit=10   (nomes parecidos, com "score")
+#     GET    /products/<id>
+#     POST   /products          {"name", "category", "quantity", "price"}
+#     PATCH  /products/<id>     (ou PUT) com os campos a alterar
+#     DELETE /products/<id>
+#
+# Uso:
+#     python server.py [--host 0.0.0.0] [--port 8080]
+
+MAX_BODY = 1024 * 1024
+MAX_HEADERS = 100
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+REFRESH_INTERVAL = 2.0  # segundos entre as verificações de alterações feitas por outros processos
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Função para converter e validar os campos de um produto recebidos em JSON.
+# partial=True (atualização) aceita só parte dos campos; retorna o dicionário de campos.
+def parse_product_fields(data, partial=False):
+    if not isinstance(data, dict):
+        raise HttpError(400, "O corpo da requisição deve ser um objeto JSON.")
+    fields = {}
+    try:
+        for field in ('name', 'category'):
+            if field in data:
+                if not isinstance(data[field], str):
+                    raise ValueError
+                fields[field] = data[field].strip()
+        if 'quantity' in data:
+            if isinstance(data['quantity'], bool) or not isinstance(data['quantity'], (int, float, str)):
+                raise ValueError
+            quantity = float(data['quantity'])
+            if quantity != int(quantity):
+                raise ValueError
+            fields['quantity'] = int(quantity)
+        if 'price' in data:
+            if isinstance(data['price'], bool) or not isinstance(data['price'], (int, float, str)):
+                raise ValueError
+            fields['price'] = float(data['price'])
+            if not math.isfinite(fields['price']):
+                raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise HttpError(400, "Quantidade e preço devem ser valores numéricos válidos.")
+
+    if partial:
+        if not fields:
+            raise HttpError(400, "Informe ao menos um campo para atualizar.")
+        # Mesmas regras da inclusão, aplicadas só aos campos enviados
+        error = validate_product(fields.get('name', '-'), fields.get('category', '-'),
+                                 fields.get('quantity', 1), fields.get('price', 1))
+    else:
+        missing = [field for field in ('name', 'category', 'quantity', 'price') if field not in fields]
+        if missing:
+            raise HttpError(400, f"Campos obrigatórios ausentes: {', '.join(missing)}.")
+        error = validate_product(fields['name'], fields['category'], fields['quantity'], fields['price'])
+    if error:
+        raise HttpError(400, error)
+    return fields
+
+
+# Função para ler um inteiro da query string
+def int_param(params, name, default, minimum=0, maximum=None):
+    value = params.get(name, [None])[0]
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise HttpError(400, f"Parâmetro '{name}' deve ser um número inteiro.")
+    value = max(minimum, value)
+    return min(value, maximum) if maximum is not None else value
+
+
+# Funções para converter o cursor (chave, ID) de uma listagem ordenada em texto e vice-versa
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(list(cursor), ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(text):
+    try:
+        key, product_id = json.loads(base64.urlsafe_b64decode(text.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise HttpError(400, "Cursor inválido.")
+    if not isinstance(product_id, int) or not isinstance(key, (str, int, float)):
+        raise HttpError(400, "Cursor inválido.")
+    return key, product_id
+
+
+class GroupCommitter:
+    # Agrupa os pedidos de gravação: quem chama commit() espera até o flush que
+    # inclui a sua alteração terminar
+    def __init__(self, store, delay=GROUP_COMMIT_DELAY):
+        self.store = store
+        self.delay = delay
+        self._waiters = []
+        self._task = None
+        self.flushing = False
+
+    async def commit(self):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            # Espera um pouco para juntar as escritas seguintes no mesmo flush
+            await asyncio.sleep(self.delay)
+            waiters, self._waiters = self._waiters, []
+            self.flushing = True
+            try:
+                await loop.run_in_executor(None, self.store.flush)
+            except Exception as error:
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                self.flushing = False
+
+    # Aguarda as gravações em andamento (usado ao encerrar)
+    async def drain(self):
+        while self._task is not None and not self._task.done():
+            await self._task
+
+
+class CatalogServer:
+    def __init__(self, store=None, commit_delay=GROUP_COMMIT_DELAY):
+        self.store = store if store is not None else ProductStore(autosave=False)
+        self.committer = GroupCommitter(self.store, commit_delay)
+        self._server = None
+        self._refresher = None
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT):
+        self.store.refresh()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self._refresher = asyncio.ensure_future(self._refresh_loop())
+        return self._server
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.committer.drain()
+        self.store.close()
+
+    # Relê o catálogo se outro processo (ex.: o terminal) alterou os dados
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            if not self.committer.flushing and not self.store.pending_count():
+                # A releitura acessa o disco e monta os índices: fora do event loop
+                await asyncio.get_running_loop().run_in_executor(None, self.store.refresh)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as error:
+                    await self._send(writer, error.status, {'erro': error.message}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HttpError as error:
+                    status, payload = error.status, {'erro': error.message}
+                except Exception as error:
+                    status, payload = 500, {'erro': f"Erro interno: {error}"}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # Lê uma linha da requisição; uma linha maior que o limite do StreamReader
+    # (64 KiB) é uma requisição inválida
+    async def _readline(self, reader):
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise HttpError(400, "Linha da requisição grande demais.")
+
+    # Lê uma requisição HTTP/1.1; retorna None quando o cliente fecha a conexão
+    async def _read_request(self, reader):
+        line = await self._readline(reader)
+        if not line:
+            return None
+        try:
+            method, target, _version = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Linha de requisição inválida.")
+        headers = {}
+        while True:
+            line = await self._readline(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(400, "Cabeçalhos demais.")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HttpError(400, "Content-Length inválido.")
+        if length < 0:
+            raise HttpError(400, "Content-Length inválido.")
+        if length > MAX_BODY:
+            raise HttpError(413, "Corpo da requisição grande demais.")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _send(self, writer, status, payload, keep_alive=True):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    # Encaminha a requisição para a rota; retorna (status, corpo JSON)
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        params = parse_qs(url.query)
+        if not parts or parts[0] != 'products' or len(parts) > 2:
+            raise HttpError(404, "Rota não encontrada.")
+
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, self.list_products(params)
+            if method == 'POST':
+                return await self.add_product(self._json(body))
+            raise HttpError(405, "Método não permitido.")
+
+        if parts[1] == 'search':
+            if method != 'GET':
+                raise HttpError(405, "Método não permitido.")
+            return 200, self.search_products(params)
+
+        if not parts[1].isdigit():
+            raise HttpError(404, "Produto não encontrado.")
+        product_id = int(parts[1])
+        if method == 'GET':
+            product = self.store.get(product_id)
+            if product is None:
+                raise HttpError(404, "Produto não encontrado.")
+            return 200, dict(product)
+        if method in ('PUT', 'PATCH'):
+            return await self.update_product(product_id, self._json(body))
+        if method == 'DELETE':
+            return await self.delete_product(product_id)
+        raise HttpError(405, "Método não permitido.")
+
+    def _json(self, body):
+        try:
+            return json.loads(body.decode('utf-8') or 'null')
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HttpError(400, "JSON inválido.")
+
+    # Retorna uma página de resultados com o total de produtos encontrados
+    # Página de uma lista (ou de um snapshot, que copia só os blocos da página)
+    def _page(self, products, params):
+        limit = int_param(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        offset = int_param(params, 'offset', 0)
+        return {'total': len(products), 'offset': offset, 'limit': limit,
+                'items': [dict(product) for product in products[offset:offset + limit]]}
+
+    # Página de "matches" ordenados pelo campo: só os offset + limit primeiros são
+    # selecionados (com um heap), em vez de ordenar todos. Empates ficam na ordem
+    # do ID, como nos índices ordenados.
+    def _sorted_page(self, products, sort, reverse, params):
+        limit = int_param(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+        offset = int_param(params, 'offset', 0)
+        key_func = SORT_KEYS[sort]
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        first = select(offset + limit, products, key=lambda product: (key_func(product), product['id']))
+        return {'total': len(products), 'offset': offset, 'limit': limit,
+                'items': [dict(product) for product in first[offset:]]}
+
+    def list_products(self, params):
+        query = params.get('q', [''])[0]
+        category = params.get('category', [''])[0]
+        sort = params.get('sort', [''])[0]
+        reverse = params.get('order', [''])[0] == 'desc'
+        if sort and sort not in ('name', 'quantity', 'price'):
+            raise HttpError(400, "Ordenação inválida. Use name, quantity ou price.")
+
+        if sort and not query and not category:
+            # Paginação por cursor: cada página continua de onde a anterior parou,
+            # sem percorrer as páginas anteriores
+            limit = int_param(params, 'limit', DEFAULT_LIMIT, 1, MAX_LIMIT)
+            cursor = params.get('cursor', [''])[0]
+            if cursor:
+                try:
+                    products, next_cursor = self.store.page(sort, limit, decode_cursor(cursor), reverse)
+                except TypeError:
+                    # Chave do cursor de outro campo (ex.: texto comparado com número)
+                    raise HttpError(400, "Cursor inválido.")
+            elif 'offset' in params:
+                # Percorre o índice só até o fim da página, sem copiar o catálogo
+                offset = int_param(params, 'offset', 0)
+                products = itertools.islice(self.store.iter_sorted(sort, reverse), offset, offset + limit)
+                return {'total': len(self.store), 'offset': offset, 'limit': limit,
+                        'items': [dict(product) for product in products]}
+            else:
+                products, next_cursor = self.store.page(sort, limit, None, reverse)
+            return {'total': len(self.store), 'limit': limit, 'items': [dict(product) for product in products],
+                    'next_cursor': encode_cursor(next_cursor) if next_cursor is not None else None}
+        else:
+            products = self.store.search(query) if query else None
+            if category:
+                in_category = self.store.filter_category(category)
+                if products is None:
+                    products = in_category
+                else:
+                    ids = {product['id'] for product in in_category}
+                    products = [product for product in products if product['id'] in ids]
+            if products is None:
+                # Sem filtro nem ordenação: a página sai direto do snapshot do catálogo
+                products = self.store.snapshot()
+            elif sort:
+                return self._sorted_page(products, sort, reverse, params)
+        return self._page(products, params)
+
+    def search_products(self, params):
+        query = params.get('q', [''])[0]
+        if not query.strip():
+            raise HttpError(400, "Informe o texto da busca em 'q'.")
+        if params.get('fuzzy', [''])[0] in ('1', 'true'):
+            limit = int_param(params, 'limit', FUZZY_LIMIT, 1, MAX_LIMIT)
+            ranked = self.store.fuzzy_search(query, limit)
+            return {'total': len(ranked), 'limit': limit,
+                    'items': [dict(product, score=round(score, 4)) for score, product in ranked]}
+        return self._page(self.store.search(query), params)
+
+    async def add_product(self, data):
+        fields = parse_product_fields(data)
+        product = self.store.add(fields['name'], fields['category'], fields['quantity'], fields['price'])
+        result = dict(product)
+        await self._commit()
+        return 201, result
+
+    async def update_product(self, product_id, data):
+        fields = parse_product_fields(data, partial=True)
+        current = self.store.get(product_id)
+        product = self.store.update(product_id, **fields)
+        if product is None:
+            raise HttpError(404, "Produto não encontrado.")
+        result = dict(product)
+        if product is not current:
+            # Se nenhum valor mudou não há o que gravar
+            await self._commit()
+        return 200, result
+
+    async def delete_product(self, product_id):
+        product = self.store.delete(product_id)
+        if product is None:
+            raise HttpError(404, "Produto não encontrado.")
+        result = dict(product)
+        await self._commit()
+        return 200, result
+
+    async def _commit(self):
+        try:
+            await self.committer.commit()
+        except Exception as error:
+            # A alteração continua pendente e será gravada no próximo flush
+            raise HttpError(503, f"Alteração aplicada, mas ainda não gravada: {error}")
+
+
+async def serve(host, port):
+    server = CatalogServer()
+    listener = await server.start(host, port)
+    addresses = ', '.join(str(sock.getsockname()) for sock in listener.sockets)
+    print(f"Servidor da AgileStore ouvindo em {addresses} ({len(server.store)} produtos).")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON do catálogo da AgileStore.")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServidor encerrado.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
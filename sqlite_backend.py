@@ -0,0 +1,170 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+import metrics
+from config import FILE_PATH, META_PATH, SQLITE_PATH
+from process_lock import FileLock, lock_path
+from product import FIELDS
+from storage import StorageBackend, next_id_for, product_row, read_meta, read_snapshot
+
+# Backend SQLite (somente biblioteca padrão).
+#
+# O banco usa WAL e cada alteração vira uma gravação só da linha afetada, feita
+# com comandos parametrizados (o sqlite3 guarda a versão compilada de cada um). Na primeira
+# abertura o conteúdo do products.json é migrado automaticamente; a migração
+# também pode ser feita manualmente:
+#
+#     python sqlite_backend.py migrate [--json products.json] [--db products.db]
+#
+# O banco não tem índices além da chave primária: o catálogo é lido inteiro na
+# carga e as buscas, filtros e ordenações usam os índices em memória do
+# ProductStore (indexes.py). Índices por nome, categoria, preço ou quantidade
+# nunca seriam consultados e só deixariam cada gravação mais lenta.
+#
+# Processos diferentes podem usar o mesmo banco: o próprio SQLite serializa as
+# transações, e os IDs novos são reservados no contador do banco dentro de uma
+# transação exclusiva, então dois processos nunca gravam produtos com o mesmo ID.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+SELECT_SQL = "SELECT id, name, category, quantity, price FROM products ORDER BY id"
+INSERT_SQL = "INSERT OR REPLACE INTO products (id, name, category, quantity, price) VALUES (?, ?, ?, ?, ?)"
+DELETE_SQL = "DELETE FROM products WHERE id = ?"
+UPDATE_SQL = {field: f"UPDATE products SET {field} = ? WHERE id = ?" for field in FIELDS[1:]}
+GET_NEXT_ID_SQL = "SELECT value FROM meta WHERE key = 'next_id'"
+MAX_ID_SQL = "SELECT MAX(id) FROM products"
+RELEASE_IDS_SQL = "UPDATE meta SET value = ? WHERE key = 'next_id' AND value = ?"
+SET_NEXT_ID_SQL = ("INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+                   "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)")
+
+
+class SqliteBackend(StorageBackend):
+    # json_path: snapshot migrado automaticamente quando o banco ainda não existe
+    def __init__(self, db_path=SQLITE_PATH, json_path=FILE_PATH, meta_path=META_PATH):
+        self.db_path = db_path
+        # A conexão é usada pela thread de gravação da interface gráfica; o lock serializa o acesso
+        self._lock = threading.Lock()
+        # Lock entre processos: o ProductStore confere a versão, grava e registra a nova
+        # versão sob ele, sem que outro processo grave no meio. A criação e a migração
+        # também o usam: quem abre o banco ao mesmo tempo espera a migração terminar,
+        # em vez de gravar produtos que ela sobrescreveria.
+        self.lock = FileLock(lock_path(db_path))
+        with self.lock:
+            is_new = not os.path.exists(db_path)
+            self.connection = sqlite3.connect(db_path, check_same_thread=False, cached_statements=64)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+            if is_new and json_path and os.path.exists(json_path):
+                self.migrate(json_path, meta_path)
+
+    # Copia o conteúdo do snapshot JSON para o banco; retorna a quantidade migrada
+    def migrate(self, json_path, meta_path=None):
+        products = read_snapshot(json_path)
+        saved_next_id = read_meta(meta_path).get('next_id', 1) if meta_path else 1
+        with self._lock, self.connection:
+            self.connection.executemany(INSERT_SQL, (product_row(product) for product in products))
+            self.connection.execute(SET_NEXT_ID_SQL, (next_id_for(products, saved_next_id),))
+        return len(products)
+
+    @metrics.timed('load.sqlite')
+    def load(self):
+        with self.lock.shared(), self._lock:
+            rows = self.connection.execute(SELECT_SQL).fetchall()
+            saved = self.connection.execute(GET_NEXT_ID_SQL).fetchone()
+        if metrics.enabled:
+            metrics.count('load.sqlite', rows=len(rows))
+        products = [dict(zip(FIELDS, row)) for row in rows]
+        return products, next_id_for(products, saved[0] if saved else 1)
+
+    # Reserva "count" IDs no contador do banco (BEGIN IMMEDIATE: um processo por vez)
+    def allocate_ids(self, count, next_id):
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                saved = self.connection.execute(GET_NEXT_ID_SQL).fetchone()
+                max_id = self.connection.execute(MAX_ID_SQL).fetchone()[0]
+                first_id = max(saved[0] if saved else 1, (max_id or 0) + 1, next_id)
+                self.connection.execute(SET_NEXT_ID_SQL, (first_id + count,))
+            except BaseException:
+                self.connection.rollback()
+                raise
+            self.connection.commit()
+        return first_id
+
+    # Devolve os IDs não usados, se nenhum outro processo reservou IDs depois deles
+    def release_ids(self, first_id, end):
+        with self._lock, self.connection:
+            self.connection.execute(RELEASE_IDS_SQL, (first_id, end))
+
+    # Grava só as linhas alteradas, em uma única transação
+    @metrics.timed('save.sqlite_commit')
+    def commit(self, records, products, next_id):
+        with self._lock, self.connection:
+            cursor = self.connection.cursor()
+            adds = []
+            for record in records:
+                if record['op'] == 'add':
+                    adds.append(product_row(record['product']))
+                    continue
+                # Inclusões consecutivas são gravadas juntas com executemany
+                if adds:
+                    cursor.executemany(INSERT_SQL, adds)
+                    adds = []
+                if record['op'] == 'update':
+                    for field, value in record['fields'].items():
+                        cursor.execute(UPDATE_SQL[field], (value, record['id']))
+                elif record['op'] == 'delete':
+                    cursor.execute(DELETE_SQL, (record['id'],))
+            if adds:
+                cursor.executemany(INSERT_SQL, adds)
+            cursor.execute(SET_NEXT_ID_SQL, (next_id,))
+        if metrics.enabled:
+            metrics.count('save.sqlite_commit', rows=len(records))
+
+    # Muda sempre que outra conexão grava no banco
+    def version(self):
+        with self._lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+        self.lock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migração do catálogo da AgileStore para SQLite.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="Copia o products.json para o banco SQLite")
+    migrate_parser.add_argument('--json', default=FILE_PATH)
+    migrate_parser.add_argument('--db', default=SQLITE_PATH)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.json):
+        print(f"Erro: arquivo '{args.json}' não encontrado.")
+        return 1
+    backend = SqliteBackend(args.db, json_path=None)
+    migrated = backend.migrate(args.json, META_PATH)
+    backend.close()
+    print(f"{migrated} produto(s) migrado(s) de '{args.json}' para '{args.db}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
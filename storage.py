@@ -0,0 +1,321 @@
+import contextlib
+import json
+import os
+import sys
+import uuid
+
+import load_cache
+import metrics
+import binary_snapshot
+from config import BINARY_SNAPSHOT, COMPACT_THRESHOLD, FILE_PATH, JOURNAL_PATH, META_PATH, SQLITE_PATH, STORAGE_MODE
+from process_lock import FileLock, lock_path
+from product import FIELDS
+
+# Backends de armazenamento do catálogo.
+#
+# O ProductStore não sabe como os dados são gravados: ele carrega o catálogo com
+# backend.load() e entrega as alterações pendentes a backend.commit(). Há três
+# implementações, escolhidas por configuração (AGILESTORE_STORAGE):
+# - 'json': o products.json é reescrito inteiro a cada gravação (JsonBackend)
+# - 'journal': as alterações são anexadas a um journal (journal.JournalBackend)
+# - 'sqlite': banco SQLite com gravações por linha (sqlite_backend.SqliteBackend)
+#
+# Vários processos podem usar o mesmo catálogo ao mesmo tempo. Os backends de
+# arquivo gravam sob um lock entre processos (process_lock.FileLock) e os IDs
+# novos são reservados em um contador compartilhado (allocate_ids), então dois
+# processos nunca dão o mesmo ID a produtos diferentes. No modo 'json' as
+# alterações passam por uma fila compartilhada (CommitSpool): quem consegue o
+# lock grava de uma vez os lotes de todos os processos (group commit), sobre a
+# versão mais recente do arquivo, e nenhuma alteração de outro processo se perde.
+
+
+# Função para aplicar um registro de alteração sobre o dicionário id -> produto.
+# Reaplicar um registro já aplicado não muda o resultado.
+def apply_record(products_by_id, record):
+    op = record['op']
+    if op == 'add':
+        product = record['product']
+        products_by_id[product['id']] = dict(product)
+    elif op == 'update':
+        product = products_by_id.get(record['id'])
+        if product is not None:
+            product.update(record['fields'])
+    elif op == 'delete':
+        products_by_id.pop(record['id'], None)
+
+
+# Função para converter um produto na tupla compacta guardada no cache de leitura
+def product_row(product):
+    return (product['id'], product['name'], sys.intern(product['category']), product['quantity'], product['price'])
+
+
+# Função para interpretar o arquivo de snapshot JSON (como tuplas, que ocupam menos memória)
+@metrics.timed('load.parse_json')
+def parse_json_snapshot(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            rows = [product_row(product) for product in json.load(file)]
+            if metrics.enabled:
+                metrics.count('load.parse_json', bytes_read=file.tell(), rows=len(rows))
+            return rows
+    return []
+
+
+# Função para ler o snapshot: pelo snapshot binário, se ativado e em dia com o JSON;
+# senão pelo JSON, gerando o binário de novo para a próxima inicialização
+def parse_snapshot(path):
+    if not BINARY_SNAPSHOT:
+        return parse_json_snapshot(path)
+    stamp = load_cache.file_stamp(path)
+    bin_path = binary_snapshot.binary_path(path)
+    if stamp is not None:
+        rows = read_binary_snapshot(bin_path, stamp)
+        if rows is not None:
+            return rows
+    rows = parse_json_snapshot(path)
+    # Só gera o binário se o JSON não mudou durante a leitura
+    if stamp is not None and load_cache.file_stamp(path) == stamp:
+        binary_snapshot.write_binary(bin_path, rows, stamp)
+    return rows
+
+
+@metrics.timed('load.read_binary')
+def read_binary_snapshot(path, stamp):
+    rows = binary_snapshot.read_binary(path, stamp)
+    if rows is not None and metrics.enabled:
+        metrics.count('load.read_binary', bytes_read=os.path.getsize(path), rows=len(rows))
+    return rows
+
+
+# Função para ler o snapshot JSON pelo cache de leitura.
+# Retorna cópias dos produtos, que podem ser alteradas sem afetar o cache.
+def read_snapshot(path):
+    return [dict(zip(FIELDS, row)) for row in load_cache.cache.load(path, parse_snapshot)]
+
+
+# Função para ler os metadados do snapshot (ex.: próximo ID a ser alocado)
+def read_meta(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    return {}
+
+
+# Função para gravar os metadados do snapshot
+def write_meta(path, meta):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+    os.replace(tmp_path, path)
+
+
+# Função para reservar "count" IDs no contador compartilhado dos metadados; retorna
+# o primeiro. next_id é o próximo ID que este processo conhece.
+def reserve_ids(meta_path, meta_lock, count, next_id):
+    with meta_lock:
+        meta = read_meta(meta_path)
+        first_id = max(meta.get('next_id', 1), next_id)
+        meta['next_id'] = first_id + count
+        write_meta(meta_path, meta)
+    return first_id
+
+
+# Função para devolver ao contador os IDs [first_id, end) reservados e não usados,
+# desde que nenhum outro processo tenha reservado IDs depois deles
+def release_ids(meta_path, meta_lock, first_id, end):
+    with meta_lock:
+        meta = read_meta(meta_path)
+        if meta.get('next_id') == end:
+            meta['next_id'] = first_id
+            write_meta(meta_path, meta)
+
+
+# Função para avançar o contador de IDs dos metadados (nunca o faz voltar)
+def advance_next_id(meta_path, meta_lock, next_id):
+    with meta_lock:
+        meta = read_meta(meta_path)
+        if meta.get('next_id', 1) < next_id:
+            meta['next_id'] = next_id
+            write_meta(meta_path, meta)
+
+
+# Função para gravar o snapshot JSON de forma atômica (arquivo temporário + rename)
+@metrics.timed('save.write_json')
+def write_snapshot(path, products):
+    # Copia os produtos para gravar (e guardar no cache) um estado consistente
+    rows = [product_row(product) for product in products]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump([dict(zip(FIELDS, row)) for row in rows], file, indent=4, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+        if metrics.enabled:
+            metrics.count('save.write_json', bytes_written=file.tell(), rows=len(rows))
+        # O rename preserva mtime, tamanho e inode: é a assinatura que o JSON terá
+        stat = os.fstat(file.fileno())
+    os.replace(tmp_path, path)
+    load_cache.cache.remember(path, rows)
+    if BINARY_SNAPSHOT:
+        binary_snapshot.write_binary(binary_snapshot.binary_path(path), rows,
+                                     (stat.st_mtime_ns, stat.st_size, stat.st_ino))
+
+
+# Função para calcular o próximo ID a partir do contador salvo e dos IDs existentes
+def next_id_for(products, saved_next_id=1):
+    if products:
+        return max(saved_next_id, max(product['id'] for product in products) + 1)
+    return saved_next_id
+
+
+class StorageBackend:
+    # Chamado (de outra thread) quando o backend reescreve os arquivos por conta
+    # própria, sem mudar o conteúdo, para o store não achar que outro processo gravou
+    on_compacted = None
+    # Lock entre processos mantido pelo ProductStore durante cada gravação
+    lock = contextlib.nullcontext()
+    # Fila compartilhada de lotes para o group commit entre processos (ou None)
+    spool = None
+
+    # Carrega o catálogo; retorna (lista de produtos, próximo ID)
+    def load(self):
+        raise NotImplementedError
+
+    # Grava os registros pendentes ({'op': 'add' | 'update' | 'delete', ...}).
+    # products() devolve o catálogo completo, para backends que reescrevem tudo.
+    def commit(self, records, products, next_id):
+        raise NotImplementedError
+
+    # Reserva "count" IDs novos; retorna o primeiro. next_id é o próximo ID conhecido
+    # pelo store: backends compartilhados entre processos reservam em um contador comum.
+    def allocate_ids(self, count, next_id):
+        return next_id
+
+    # Devolve os IDs [first_id, end) reservados e não usados (ao fechar o store)
+    def release_ids(self, first_id, end):
+        pass
+
+    # Valor que muda quando outro processo altera os dados gravados
+    def version(self):
+        return None
+
+    def close(self):
+        pass
+
+
+# Fila de lotes de alterações ainda não gravados no snapshot, compartilhada pelos
+# processos (um lote por linha JSON: {"token": ..., "records": [...]}).
+#
+# Cada processo anexa o seu lote e depois disputa o lock de gravação; quem o
+# consegue grava todos os lotes da fila em uma única reescrita e os descarta. Quem
+# chega depois e não encontra mais o seu lote sabe que ele já foi gravado. Como
+# reaplicar um registro não muda o resultado, uma queda entre a gravação e o
+# descarte só faz os lotes serem aplicados de novo.
+class CommitSpool:
+    def __init__(self, path, lock):
+        self.path = path
+        self.lock = lock  # Lock curto, só para anexar, ler e descartar lotes
+
+    # Anexa um lote de registros; retorna o identificador do lote
+    def append(self, records):
+        token = uuid.uuid4().hex
+        line = json.dumps({'token': token, 'records': records}, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self.lock:
+            with open(self.path, 'a+b') as file:
+                if file.tell():
+                    # Termina uma linha deixada pela metade por uma queda
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b'\n':
+                        file.write(b'\n')
+                file.write(line.encode('utf-8'))
+                file.flush()
+                os.fsync(file.fileno())
+        return token
+
+    # Lê os lotes da fila; retorna ([(token, registros), ...], bytes lidos)
+    def read(self):
+        with self.lock:
+            try:
+                with open(self.path, 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                return [], 0
+        batches = []
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Linha truncada por uma queda durante a escrita: ignora
+                continue
+            batches.append((entry['token'], entry['records']))
+        return batches, len(data)
+
+    # Descarta os primeiros "size" bytes (lotes já gravados), preservando os que chegaram depois
+    def discard(self, size):
+        with self.lock:
+            with open(self.path, 'rb') as file:
+                file.seek(size)
+                rest = file.read()
+            if not rest:
+                os.remove(self.path)
+                return
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(rest)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class JsonBackend(StorageBackend):
+    def __init__(self, file_path=FILE_PATH, meta_path=META_PATH):
+        self.file_path = file_path
+        self.meta_path = meta_path
+        self.lock = FileLock(lock_path(file_path))
+        self.meta_lock = FileLock(lock_path(meta_path))
+        self.spool = CommitSpool(file_path + '.pending', self.meta_lock)
+
+    def load(self):
+        with self.lock.shared():
+            products = read_snapshot(self.file_path)
+            saved_next_id = read_meta(self.meta_path).get('next_id', 1)
+        batches, _ = self.spool.read()
+        if batches:
+            # Lotes de outros processos que ainda vão ser gravados no snapshot
+            products_by_id = {product['id']: product for product in products}
+            for _, records in batches:
+                for record in records:
+                    apply_record(products_by_id, record)
+            products = list(products_by_id.values())
+        return products, next_id_for(products, saved_next_id)
+
+    def allocate_ids(self, count, next_id):
+        return reserve_ids(self.meta_path, self.meta_lock, count, next_id)
+
+    def release_ids(self, first_id, end):
+        release_ids(self.meta_path, self.meta_lock, first_id, end)
+
+    def commit(self, records, products, next_id):
+        # Várias alterações pendentes viram uma única reescrita do snapshot
+        write_snapshot(self.file_path, products())
+        advance_next_id(self.meta_path, self.meta_lock, next_id)
+
+    def version(self):
+        return load_cache.file_stamp(self.file_path)
+
+    def close(self):
+        self.lock.close()
+        self.meta_lock.close()
+
+
+# Função para criar o backend configurado
+def create_backend(mode=STORAGE_MODE, file_path=FILE_PATH, meta_path=META_PATH, journal_path=JOURNAL_PATH,
+                   compact_threshold=COMPACT_THRESHOLD, sqlite_path=SQLITE_PATH):
+    if mode == 'json':
+        return JsonBackend(file_path, meta_path)
+    if mode == 'journal':
+        from journal import JournalBackend
+        return JournalBackend(file_path, journal_path, meta_path, compact_threshold)
+    if mode == 'sqlite':
+        from sqlite_backend import SqliteBackend
+        return SqliteBackend(sqlite_path, file_path, meta_path)
+    raise ValueError(f"Modo de armazenamento desconhecido: '{mode}'. Use 'json', 'journal' ou 'sqlite'.")
@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+# Vários processos gravando o mesmo catálogo ao mesmo tempo (lock entre processos,
+# fila do group commit e reserva de IDs em blocos): nenhuma alteração pode se
+# perder e nenhum ID pode se repetir.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSES = 4
+ADDS = 30
+DELETES = 5
+
+# Cada processo cria os seus produtos, altera o produto inicial que é só dele e
+# os seus próprios produtos e exclui alguns deles
+WORKER = """
+import sys
+from product_store import ProductStore
+
+worker = int(sys.argv[1])
+store = ProductStore()
+ids = [store.add(f'w{worker}-{i}', f'c{worker}', 1, 1.0)['id'] for i in range(%(adds)d)]
+for step in range(1, 11):
+    store.update(worker + 1, quantity=100 * (worker + 1) + step)
+for product_id in ids[:10]:
+    store.update(product_id, quantity=5)
+for product_id in ids[-%(deletes)d:]:
+    store.delete(product_id)
+store.close()
+""" % {'adds': ADDS, 'deletes': DELETES}
+
+
+def run(tmp_path, mode, code, *args):
+    env = dict(os.environ, AGILESTORE_STORAGE=mode, AGILESTORE_FILE=str(tmp_path / 'products.json'),
+               AGILESTORE_ID_BLOCK='7', PYTHONPATH=ROOT)
+    for name in ('AGILESTORE_META', 'AGILESTORE_SQLITE', 'AGILESTORE_JOURNAL'):
+        env.pop(name, None)
+    return subprocess.Popen([sys.executable, '-c', code, *map(str, args)], cwd=tmp_path, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def check(process):
+    stdout, stderr = process.communicate(timeout=120)
+    assert process.returncode == 0, stderr
+    return stdout
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_concurrent_writers(tmp_path, mode):
+    # Um produto inicial por processo, alterado só por ele
+    check(run(tmp_path, mode, """
+from product_store import ProductStore
+store = ProductStore()
+store.add_many([{'name': f'seed{i}', 'category': 'seed', 'quantity': 1, 'price': 1.0} for i in range(%d)])
+store.close()
+""" % PROCESSES))
+
+    workers = [run(tmp_path, mode, WORKER, worker) for worker in range(PROCESSES)]
+    for process in workers:
+        check(process)
+
+    output = check(run(tmp_path, mode, """
+import json
+from product_store import ProductStore
+print(json.dumps([dict(product) for product in ProductStore().all()]))
+"""))
+    products = json.loads(output)
+
+    ids = [product['id'] for product in products]
+    assert len(ids) == len(set(ids))
+    names = {product['name'] for product in products}
+    expected = {f'seed{i}' for i in range(PROCESSES)}
+    expected |= {f'w{worker}-{i}' for worker in range(PROCESSES) for i in range(ADDS - DELETES)}
+    assert names == expected
+
+    by_name = {product['name']: product for product in products}
+    for worker in range(PROCESSES):
+        assert by_name[f'seed{worker}']['quantity'] == 100 * (worker + 1) + 10
+        for i in range(ADDS - DELETES):
+            assert by_name[f'w{worker}-{i}']['quantity'] == (5 if i < 10 else 1)
+
+
+# Um processo que grava entre a conferência da versão e a gravação de outro não
+# pode ter a sua versão registrada sem as suas linhas (refresh() nunca as veria)
+def test_sqlite_commit_is_atomic(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(ROOT)
+    from product_store import ProductStore
+    from sqlite_backend import SqliteBackend
+
+    db_path = str(tmp_path / 'products.db')
+    first = ProductStore(SqliteBackend(db_path, None), autosave=False)
+    second = ProductStore(SqliteBackend(db_path, None), autosave=False)
+    first.load()
+    second.load()
+    first.add('first', 'c', 1, 1.0)
+    second.add('second', 'c', 1, 1.0)
+
+    commit = first.backend.commit
+    writers = []
+
+    def commit_with_writer(*args):
+        writer = threading.Thread(target=second.flush)
+        writer.start()
+        writers.append(writer)
+        time.sleep(0.2)
+        commit(*args)
+
+    first.backend.commit = commit_with_writer
+    first.flush()
+    writers[0].join()
+
+    assert first.refresh()
+    assert {product['name'] for product in first.all()} == {'first', 'second'}
+    first.close()
+    second.close()
@@ -0,0 +1,118 @@
+import tkinter as tk
+from tkinter import ttk
+
+import metrics
+
+# Tabela virtualizada sobre um ttk.Treeview.
+#
+# Em vez de inserir todos os produtos na árvore, só a janela visível (mais um
+# pequeno buffer) é materializada; a barra de rolagem e a roda do mouse movem
+# essa janela sobre a lista de linhas. A cada atualização é aplicado um diff por
+# linha (inserir, alterar ou remover só os itens que mudaram), usando o ID do
+# produto como iid do item.
+
+
+class VirtualTreeview:
+    # format_row converte um produto na tupla de valores exibida na tabela
+    def __init__(self, parent, columns, format_row, virtual=True, buffer=10):
+        self.format_row = format_row
+        self.virtual = virtual
+        self.buffer = buffer
+        self.rows = []
+        self.offset = 0  # Índice da primeira linha exibida
+        self.visible = 20  # Quantidade de linhas que cabem na tela
+        self._rendered = {}  # iid -> valores atualmente na árvore
+        self._order = []  # iids na ordem em que estão na árvore
+
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings")
+        if virtual:
+            self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self._on_scrollbar)
+            self.tree.bind("<Configure>", self._on_resize)
+            self.tree.bind("<MouseWheel>", self._on_mousewheel)
+            self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+            self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+            self.tree.bind("<Prior>", lambda event: self.scroll(-self.visible))
+            self.tree.bind("<Next>", lambda event: self.scroll(self.visible))
+        else:
+            self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.tree.yview)
+            self.tree.configure(yscroll=self.scrollbar.set)
+
+    # Define as linhas exibidas e atualiza a tabela
+    def set_rows(self, rows, reset_scroll=False):
+        self.rows = rows
+        if reset_scroll:
+            self.offset = 0
+        self.refresh()
+
+    # Desloca a janela visível em "amount" linhas
+    def scroll(self, amount):
+        self.offset += amount
+        self.refresh()
+        return "break"
+
+    # Reaplica a janela atual na árvore, alterando só as linhas que mudaram
+    @metrics.timed('gui.render')
+    def refresh(self):
+        if self.virtual:
+            self.offset = max(0, min(self.offset, len(self.rows) - self.visible))
+            window = self.rows[self.offset:self.offset + self.visible + self.buffer]
+        else:
+            window = self.rows
+        desired = [(str(product['id']), self.format_row(product)) for product in window]
+        desired_ids = {iid for iid, _ in desired}
+
+        removed = 0
+        for iid in self._order:
+            if iid not in desired_ids:
+                self.tree.delete(iid)
+                del self._rendered[iid]
+                removed += 1
+
+        # Só reposiciona itens existentes se a ordem relativa deles mudou
+        kept = [iid for iid in self._order if iid in desired_ids]
+        reorder = kept != [iid for iid, _ in desired if iid in self._rendered]
+
+        rendered = 0
+        for position, (iid, values) in enumerate(desired):
+            current = self._rendered.get(iid)
+            if current is None:
+                self.tree.insert("", position, iid=iid, values=values)
+                rendered += 1
+            else:
+                if current != values:
+                    self.tree.item(iid, values=values)
+                    rendered += 1
+                if reorder:
+                    self.tree.move(iid, "", position)
+            self._rendered[iid] = values
+        self._order = [iid for iid, _ in desired]
+        if metrics.enabled:
+            metrics.count('gui.render', rows_rendered=rendered, rows_removed=removed, rows_total=len(self.rows))
+
+        if self.virtual:
+            total = len(self.rows)
+            if total:
+                self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+            else:
+                self.scrollbar.set(0.0, 1.0)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.rows))
+            self.refresh()
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll(int(args[1]) * step)
+
+    def _on_mousewheel(self, event):
+        # No Windows o delta vem em múltiplos de 120; no macOS, em unidades pequenas
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-3 * delta)
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        # Desconta a linha do cabeçalho
+        visible = max(1, event.height // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()